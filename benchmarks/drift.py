@@ -0,0 +1,90 @@
+"""
+Drift detection across many applications against local fake AS3 servers.
+
+Deploys --applications synthetic applications spread over --clusters fake
+devices and records them in a temporary declaration store. It then edits
+--drift of them on the devices by hand and runs detect_as3_drift. Reports the
+run time, the applications found drifted, and the AS3 requests per device.
+
+Usage:
+    python -m benchmarks.drift --applications 2000 --clusters 4 --drift 25
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from collections import Counter
+
+from benchmarks.fakes import FakeAS3Server, as3_declaration, isolate_local_state
+from flows.detect_as3_drift import detect_as3_drift
+from tasks.artifacts import PreparedDeclaration
+from tasks.declaration_store import DeclarationStore
+
+TENANT = "Bank"
+
+
+def populate(servers: list[FakeAS3Server], applications: int) -> list[tuple[FakeAS3Server, str]]:
+    """Deploy applications round-robin over servers, as a completed deploy flow would leave them."""
+    store = DeclarationStore()
+    deployed = []
+    for i in range(applications):
+        server = servers[i % len(servers)]
+        name = f"app_{i:05d}"
+        declaration = as3_declaration(name, pools=2)
+        server.declarations.setdefault(TENANT, {})[name] = declaration[name]
+        store.save(
+            str(uuid.uuid4()),
+            server.address,
+            f"cluster-{server.address}",
+            TENANT,
+            uuid.uuid4().hex,
+            PreparedDeclaration.from_dict(declaration),
+        )
+        deployed.append((server, name))
+    return deployed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--applications", type=int, default=2000, help="applications deployed in total")
+    parser.add_argument("--clusters", type=int, default=4, help="fake AS3 devices")
+    parser.add_argument("--drift", type=int, default=25, help="applications changed by hand on the devices")
+    parser.add_argument("--redeploy", action="store_true", help="redeploy drifted applications")
+    parser.add_argument("--as3-latency", type=float, default=0.02, help="seconds added to every AS3 request")
+    args = parser.parse_args()
+
+    isolate_local_state("drift")
+    os.environ.setdefault("F5_USERNAME", "admin")
+    os.environ.setdefault("F5_PASSWORD", "admin")
+
+    servers = [FakeAS3Server(latency=args.as3_latency) for _ in range(args.clusters)]
+    for server in servers:
+        server.__enter__()
+    try:
+        deployed = populate(servers, args.applications)
+        changed = random.sample(deployed, args.drift)
+        for server, name in changed:
+            server.declarations[TENANT][name]["pool_0"]["members"][0]["servicePort"] = 8080
+
+        start = time.perf_counter()
+        drifted = asyncio.run(detect_as3_drift(redeploy=args.redeploy))
+        elapsed = time.perf_counter() - start
+
+        found = {(d["address"], d["application"]) for d in drifted}
+        expected = {(server.address, name) for server, name in changed}
+        requests: Counter[str] = Counter()
+        for server in servers:
+            requests.update(server.requests)
+        print(f"{args.applications} applications on {args.clusters} devices, {args.drift} changed by hand")
+        print(f"  run time           {elapsed:8.2f} s (including flow start)")
+        print(f"  drifted found      {len(found):8d} ({'all' if found == expected else 'MISMATCH with'} changed)")
+        print(f"  as3 requests       {dict(requests)}")
+    finally:
+        for server in servers:
+            server.__exit__(None, None, None)
+
+
+if __name__ == "__main__":
+    main()
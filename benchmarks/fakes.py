@@ -0,0 +1,467 @@
+"""
+In-process stand-ins for Infrahub and the F5 AS3 API, with configurable latency.
+
+FakeInfrahub implements the subset of the InfrahubClient interface the flows use
+(node get/create/save, relationship fetch, branches and the object store) and
+counts every call that would have been a GraphQL or object store request. The
+object store is also served over plain HTTP at its address, for the streaming
+artifact download.
+
+FakeAS3Server is a real HTTPS server on localhost serving the AS3 endpoints used
+by the deploy flow, so the requests-based client code runs unchanged against it.
+"""
+import asyncio
+import datetime
+import gzip
+import itertools
+import json
+import os
+import ssl
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable
+
+import httpx
+from infrahub_sdk.exceptions import BranchNotFoundError
+
+
+class FakeRelationship:
+    """Relationship of cardinality one, resolved by fetch()."""
+
+    def __init__(self, client: "FakeInfrahub", peer: "FakeNode"):
+        self._client = client
+        self._peer = peer
+        self.peer = None
+
+    async def fetch(self) -> None:
+        await self._client._request("graphql")
+        self.peer = self._peer
+
+
+class FakeRelationshipManager:
+    """Relationship of cardinality many, resolved by fetch()."""
+
+    def __init__(self, client: "FakeInfrahub", peers: list["FakeNode"]):
+        self._client = client
+        self._peers = peers
+        self.peers: list[SimpleNamespace] = []
+
+    async def fetch(self) -> None:
+        await self._client._request("graphql")
+        self.peers = [SimpleNamespace(peer=peer) for peer in self._peers]
+
+
+class FakeNode:
+    def __init__(self, client: "FakeInfrahub", kind: str, id: str | None = None, **attributes: Any):
+        self._client = client
+        self.kind = kind
+        self.id = id or str(uuid.uuid4())
+        for name, value in attributes.items():
+            if isinstance(value, FakeNode):
+                setattr(self, name, FakeRelationship(client, value))
+            elif isinstance(value, list) and value and all(isinstance(v, FakeNode) for v in value):
+                setattr(self, name, FakeRelationshipManager(client, value))
+            else:
+                setattr(self, name, SimpleNamespace(value=value))
+
+    async def save(self, allow_upsert: bool = False) -> None:
+        await self._client._request("graphql")
+        self._client.saved.append(self)
+
+
+class FakeBranches:
+    def __init__(self, client: "FakeInfrahub"):
+        self._client = client
+        self.branches: dict[str, SimpleNamespace] = {"main": SimpleNamespace(name="main")}
+
+    async def get(self, branch_name: str) -> SimpleNamespace:
+        await self._client._request("graphql")
+        if branch_name not in self.branches:
+            raise BranchNotFoundError(identifier=branch_name)
+        return self.branches[branch_name]
+
+    async def create(self, branch_name: str, description: str = "", sync_with_git: bool = False) -> SimpleNamespace:
+        await self._client._request("graphql")
+        self.branches[branch_name] = SimpleNamespace(name=branch_name, description=description)
+        return self.branches[branch_name]
+
+
+class FakeObjectStore:
+    def __init__(self, client: "FakeInfrahub"):
+        self._client = client
+        self.objects: dict[str, str | bytes] = {}
+
+    async def get(self, identifier: str) -> str:
+        await self._client._request("object_store")
+        data = self.objects.get(identifier, "")
+        return data.decode() if isinstance(data, bytes) else data
+
+
+class FakeInfrahub:
+    """Fake InfrahubClient holding nodes in memory. latency is added to every request."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests: Counter[str] = Counter()
+        self.nodes: dict[str, FakeNode] = {}
+        self.saved: list[FakeNode] = []
+        self.branch = FakeBranches(self)
+        self.object_store = FakeObjectStore(self)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Prefect hashes task inputs, this client among them; the server cannot be pickled
+        return {k: v for k, v in self.__dict__.items() if k != "_server"}
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                fake.requests["object_store"] += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                prefix = "/api/storage/object/"
+                data = fake.object_store.objects.get(self.path[len(prefix):]) if self.path.startswith(prefix) else None
+                if data is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = data if isinstance(data, bytes) else data.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                for i in range(0, len(body), 64 * 1024):
+                    self.wfile.write(body[i : i + 64 * 1024])
+
+        return Handler
+
+    @asynccontextmanager
+    async def _get_streaming(self, url: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        # Stands in for InfrahubClient._get_streaming, the SDK's streaming GET
+        async with httpx.AsyncClient() as http:
+            async with http.stream("GET", url) as response:
+                yield response
+
+    async def login(self, refresh: bool = False) -> None:
+        pass
+
+    async def _request(self, endpoint: str) -> None:
+        self.requests[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def get_version(self) -> str:
+        await self._request("graphql")
+        return "fake"
+
+    def add_node(self, kind: str, id: str | None = None, **attributes: Any) -> FakeNode:
+        node = FakeNode(self, kind, id=id, **attributes)
+        self.nodes[node.id] = node
+        return node
+
+    async def get(self, kind: Any, id: str | None = None, **filters: Any) -> FakeNode:
+        await self._request("graphql")
+        if id is not None:
+            return self.nodes[id]
+        for node in self.nodes.values():
+            if node.kind == kind and all(getattr(node, k.split("__")[0]).value == v for k, v in filters.items()):
+                return node
+        return self.add_node(kind, **{k.split("__")[0]: v for k, v in filters.items()})
+
+    async def create(self, kind: Any, data: dict[str, Any] | None = None, branch: str | None = None) -> FakeNode:
+        return FakeNode(self, getattr(kind, "__name__", kind), **(data or {}))
+
+    def add_cluster(self, cluster_address: str, member_addresses: list[str] | None = None) -> FakeNode:
+        """Add a cluster managed at cluster_address, optionally with members managed at member_addresses."""
+        # The flow reads address.value.ip; a host:port string lets it reach a FakeAS3Server on any port.
+        address = self.add_node("IpamIPAddress", address=SimpleNamespace(ip=cluster_address))
+        members = [
+            self.add_node(
+                "InfraDevice",
+                name=f"device-{a}",
+                primary_address=self.add_node("IpamIPAddress", address=SimpleNamespace(ip=a)),
+            )
+            for a in member_addresses or []
+        ]
+        return self.add_node(
+            "NetautoF5Cluster",
+            name=f"cluster-{cluster_address}",
+            primary_address=address,
+            **({"members": members} if members else {}),
+        )
+
+    def add_application(
+        self, cluster_address: str | list[str], tenant: str = "Bank", declaration: dict | None = None
+    ) -> tuple[FakeNode, str]:
+        """
+        Add an application deployed to cluster_address, or to several clusters
+        (through f5_clusters) when given a list. Returns the node and its artifact storage id.
+        """
+        entity = self.add_node("OrganizationEntity", name=tenant)
+        if isinstance(cluster_address, list):
+            clusters = {"f5_clusters": [self.add_cluster(a) for a in cluster_address]}
+        else:
+            clusters = {"f5_cluster": self.add_cluster(cluster_address)}
+        application = self.add_node("NetautoFlexApplication", entity=entity, deployment_status="unknown", **clusters)
+        storage_id = str(uuid.uuid4())
+        self.object_store.objects[storage_id] = json.dumps(declaration or as3_declaration(f"app_{application.id[:8]}"))
+        return application, storage_id
+
+
+def as3_declaration(name: str, pools: int = 1, members: int = 2) -> dict[str, Any]:
+    """Per-application AS3 declaration with the XXXXXX placeholder the deploy flow rewrites."""
+    app: dict[str, Any] = {
+        "class": "Application",
+        "template": "generic",
+        "vs_XXXXXX": {
+            "class": "Service_HTTP",
+            "virtualAddresses": ["10.0.0.10"],
+            "pool": "pool_0",
+        },
+    }
+    for p in range(pools):
+        app[f"pool_{p}"] = {
+            "class": "Pool",
+            "monitors": ["http"],
+            "members": [{"servicePort": 80, "serverAddresses": [f"10.1.{p % 256}.{m % 256}" for m in range(members)]}],
+        }
+    return {"schemaVersion": "3.50.0", name: app}
+
+
+def isolate_local_state(name: str) -> str:
+    """
+    Point the declaration store, the task cache and, if journaling is on, the event
+    journal at a fresh temporary directory. A benchmark then never leaves fake
+    devices or cache keys behind for the real flows, such as the scheduled drift check.
+    Call it before the flows are imported: the cache directory is read at import time.
+    """
+    root = tempfile.mkdtemp(prefix=f"{name}-benchmark-")
+    os.environ["AS3_DECLARATION_STORE"] = os.path.join(root, "declarations")
+    os.environ["NETAUTO_CACHE_DIR"] = os.path.join(root, "cache")
+    if os.getenv("WEBHOOK_JOURNAL_DIR"):
+        os.environ["WEBHOOK_JOURNAL_DIR"] = os.path.join(root, "journal")
+    return root
+
+
+def _self_signed_context(host: str) -> ssl.SSLContext:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, host)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    directory = tempfile.mkdtemp(prefix="fake-as3-")
+    cert_path, key_path = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+class FakeAS3Server:
+    """
+    HTTPS server implementing authn/login, appsvcs/settings, appsvcs/declare (POST
+    per application, GET for every tenant) and appsvcs/task.
+
+    latency is added to every request. reject, if set, is called with each posted
+    declaration and makes the post fail with 422 when it returns True. Declarations
+    may be sent with Content-Encoding: gzip unless accept_gzip is False, in which
+    case they are answered with 415. With parse_declarations=False posted bodies
+    are only counted, so the server adds no memory of its own to in-process
+    measurements. Use as a context manager; address is the host:port to use as
+    the cluster management address.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        per_app_allowed: bool = True,
+        reject: Callable[[dict[str, Any]], bool] | None = None,
+        accept_gzip: bool = True,
+        parse_declarations: bool = True,
+    ):
+        self.latency = latency
+        self.per_app_allowed = per_app_allowed
+        self.reject = reject
+        self.accept_gzip = accept_gzip
+        self.parse_declarations = parse_declarations
+        self.requests: Counter[str] = Counter()
+        self.bytes_received = 0
+        self.declarations: dict[str, dict[str, Any]] = {}
+        self.tasks: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count(1)
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._server.socket = _self_signed_context(host).wrap_socket(self._server.socket, server_side=True)
+        self._thread: threading.Thread | None = None
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    def __enter__(self) -> "FakeAS3Server":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, endpoint: str) -> None:
+        with self._lock:
+            self.requests[endpoint] += 1
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: Any) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self) -> Any:
+                length = int(self.headers.get("Content-Length") or 0)
+                data = self.rfile.read(length)
+                with fake._lock:
+                    fake.bytes_received += len(data)
+                if self.headers.get("Content-Encoding") == "gzip":
+                    data = gzip.decompress(data)
+                return json.loads(data or b"{}")
+
+            def _authorized(self) -> bool:
+                if self.headers.get("X-F5-Auth-Token"):
+                    return True
+                self._send(401, {"code": 401, "message": "Authorization failed"})
+                return False
+
+            def do_GET(self):
+                if fake.latency:
+                    time.sleep(fake.latency)
+                path = self.path.split("?")[0]
+                if path == "/mgmt/shared/appsvcs/settings":
+                    fake._count("settings")
+                    if self._authorized():
+                        self._send(200, {"perAppDeploymentAllowed": fake.per_app_allowed})
+                elif path == "/mgmt/shared/appsvcs/declare":
+                    fake._count("declare/get")
+                    if not self._authorized():
+                        return
+                    with fake._lock:
+                        tenants = {t: {"class": "Tenant", **apps} for t, apps in fake.declarations.items()}
+                    if not tenants:
+                        self.send_response(204)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self._send(200, {"class": "ADC", "schemaVersion": "3.50.0", "id": "autogen", **tenants})
+                elif path.startswith("/mgmt/shared/appsvcs/task/"):
+                    fake._count("task")
+                    task = fake.tasks.get(path.rsplit("/", 1)[-1])
+                    if self._authorized():
+                        self._send(200 if task else 404, task or {"code": 404, "message": "task not found"})
+                else:
+                    self._send(404, {"code": 404, "message": f"{path} not found"})
+
+            def do_POST(self):
+                if fake.latency:
+                    time.sleep(fake.latency)
+                path, _, query = self.path.partition("?")
+                parts = path.strip("/").split("/")
+                if path == "/mgmt/shared/authn/login":
+                    fake._count("authn/login")
+                    self._body()
+                    self._send(200, {"token": {"token": uuid.uuid4().hex}})
+                elif path == "/mgmt/shared/appsvcs/settings":
+                    fake._count("settings")
+                    if self._authorized():
+                        fake.per_app_allowed = bool(self._body().get("perAppDeploymentAllowed"))
+                        self._send(200, {"perAppDeploymentAllowed": fake.per_app_allowed})
+                elif parts[:4] == ["mgmt", "shared", "appsvcs", "declare"] and len(parts) == 6:
+                    fake._count("declare")
+                    if not self._authorized():
+                        return
+                    if self.headers.get("Content-Encoding") == "gzip" and not fake.accept_gzip:
+                        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                        self._send(415, {"code": 415, "message": "Unsupported Content-Encoding"})
+                        return
+                    if not fake.per_app_allowed:
+                        self._send(422, {"code": 422, "message": "per-application deployment is not allowed"})
+                        return
+                    if not fake.parse_declarations:
+                        with fake._lock:
+                            fake.bytes_received += len(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+                        self._send(200, {"results": [{"code": 200, "message": "success", "tenant": parts[4]}]})
+                        return
+                    tenant, declaration = parts[4], self._body()
+                    if fake.reject and fake.reject(declaration):
+                        self._send(422, {"code": 422, "message": "declaration is invalid"})
+                        return
+                    with fake._lock:
+                        fake.declarations.setdefault(tenant, {}).update(
+                            {k: v for k, v in declaration.items() if isinstance(v, dict)}
+                        )
+                    results = [{"code": 200, "message": "success", "tenant": tenant}]
+                    if "async=true" in query:
+                        task_id = str(next(fake._task_ids))
+                        fake.tasks[task_id] = {"id": task_id, "results": results}
+                        self._send(202, {"id": task_id, "results": [{"message": "Declaration successfully submitted"}]})
+                    else:
+                        self._send(200, {"results": results})
+                else:
+                    self._send(404, {"code": 404, "message": f"{path} not found"})
+
+        return Handler
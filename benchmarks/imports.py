@@ -0,0 +1,60 @@
+"""
+Import-time benchmark for the flow modules.
+
+Imports each module in a fresh interpreter several times and reports the median
+wall time, so cold-start cost per route can be tracked between commits. Results
+are recorded like the other benchmarks in benchmarks/results/imports.jsonl.
+
+Usage:
+    python -m benchmarks.imports --repeat 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+from benchmarks.run import git_commit, save_result
+
+MODULES = (
+    "prefect",
+    "flows.webhook_handler",
+    "flows.handle_ticket_created",
+    "flows.deploy_as3_application",
+)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_seconds(module: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    child = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(child.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-save", action="store_true", help="do not record the result")
+    args = parser.parse_args()
+
+    results = {module: statistics.median(import_seconds(module) for _ in range(args.repeat)) * 1000 for module in MODULES}
+    record = {
+        "scenario": "imports",
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {"repeat": args.repeat},
+        "results": results,
+    }
+    previous = None if args.no_save else save_result("imports", record)
+
+    print(f"Median import time over {args.repeat} fresh interpreters @ {record['commit']}")
+    for module, ms in results.items():
+        line = f"  {module:<32}{ms:>9.1f} ms"
+        if previous and module in previous["results"]:
+            line += f"   (was {previous['results'][module]:.1f} ms @ {previous['commit']})"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
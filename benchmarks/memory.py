@@ -0,0 +1,91 @@
+"""
+Peak memory and bytes on the wire for one deploy of a large AS3 declaration.
+
+Compares the buffered path (read the artifact into a string, parse it, render by
+serializing and re-parsing, post it as JSON) with the streaming path the deploy
+flow uses (stream, render and gzip in chunks, post the body, compressed only with
+--gzip). Peak memory is the tracemalloc peak across both the fetch and the post.
+
+Usage:
+    python -m benchmarks.memory --pools 20000 --members 4 --gzip
+"""
+import argparse
+import asyncio
+import json
+import os
+import tracemalloc
+import uuid
+from typing import Any, Awaitable, Callable
+
+import requests
+
+from prefect import flow
+
+from benchmarks.fakes import FakeAS3Server, FakeInfrahub, as3_declaration
+from flows.deploy_as3_application import _f5_login, deploy_as3
+from tasks.artifacts import fetch_rendered_artifact
+
+TENANT = "Bank"
+
+
+async def buffered(infrahub: FakeInfrahub, storage_id: str, address: str, checksum: str) -> None:
+    payload = json.loads(await infrahub.object_store.get(identifier=storage_id))
+    payload = json.loads(json.dumps(payload).replace("XXXXXX", checksum[:6]))
+    token = _f5_login(address, "admin", "admin")
+    r = requests.post(
+        f"https://{address}/mgmt/shared/appsvcs/declare/{TENANT}/applications",
+        headers={"Content-Type": "application/json", "X-F5-Auth-Token": token},
+        json=payload,
+        verify=False,
+        timeout=120,
+    )
+    r.raise_for_status()
+
+
+async def streaming(infrahub: FakeInfrahub, storage_id: str, address: str, checksum: str) -> None:
+    declaration = await fetch_rendered_artifact.fn(infrahub, storage_id, {"XXXXXX": checksum[:6]})
+    await asyncio.to_thread(deploy_as3, address, TENANT, declaration)
+
+
+async def measure(path: Callable[..., Awaitable[None]], infrahub: FakeInfrahub, storage_id: str) -> dict[str, Any]:
+    with FakeAS3Server(parse_declarations=False) as as3:
+        tracemalloc.start()
+        try:
+            await path(infrahub, storage_id, as3.address, uuid.uuid4().hex)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {"peak_mb": peak / 2**20, "sent_mb": as3.bytes_received / 2**20}
+
+
+@flow(name="benchmark-declaration-memory")
+async def run(pools: int, members: int) -> dict[str, Any]:
+    infrahub = FakeInfrahub()
+    try:
+        declaration = json.dumps(as3_declaration("app_memory", pools=pools, members=members))
+        storage_id = str(uuid.uuid4())
+        infrahub.object_store.objects[storage_id] = declaration.encode()
+        results = {"declaration_mb": len(declaration) / 2**20}
+        for path in (buffered, streaming):
+            results[path.__name__] = await measure(path, infrahub, storage_id)
+        return results
+    finally:
+        infrahub.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pools", type=int, default=20000, help="pools in the synthetic declaration")
+    parser.add_argument("--members", type=int, default=4, help="members per pool")
+    parser.add_argument("--gzip", action="store_true", help="post the streamed declaration gzip-compressed")
+    args = parser.parse_args()
+    os.environ["AS3_GZIP"] = "true" if args.gzip else "false"
+
+    results = asyncio.run(run(args.pools, args.members))
+    print(f"declaration: {results['declaration_mb']:.1f} MiB")
+    for name in ("buffered", "streaming"):
+        print(f"  {name:<10} peak {results[name]['peak_mb']:8.1f} MiB   sent {results[name]['sent_mb']:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Orchestration overhead per event in each hot-step execution mode.
+
+Runs deploy_as3_application sequentially against zero-latency fakes, once with
+hot-path steps as Prefect tasks and once inline (NETAUTO_TASK_MODE), so the time
+per event is almost entirely orchestration. Each mode runs in a fresh process
+because the mode is fixed at import time.
+
+Usage:
+    python -m benchmarks.orchestration --events 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.fakes import isolate_local_state
+
+MODES = ("task", "inline")
+
+
+async def measure(events: int) -> dict[str, float]:
+    from benchmarks.fakes import FakeAS3Server, FakeInfrahub
+    from benchmarks.run import build_events, patch_clients
+    from flows.deploy_as3_application import deploy_as3_application
+
+    infrahub = FakeInfrahub()
+    with FakeAS3Server() as as3, patch_clients(infrahub):
+        batch = build_events("deploy", events + 1, infrahub, as3, applications=1)
+        # The first run starts Prefect's temporary API server; leave it out.
+        await deploy_as3_application(batch[0])
+        durations = []
+        for event in batch[1:]:
+            start = time.perf_counter()
+            await deploy_as3_application(event)
+            durations.append(time.perf_counter() - start)
+    durations.sort()
+    return {
+        "mean_ms": sum(durations) / len(durations) * 1000,
+        "p50_ms": durations[len(durations) // 2] * 1000,
+        "max_ms": durations[-1] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure(args.events))))
+        return
+
+    # Inherited by both children
+    isolate_local_state("orchestration")
+    results = {}
+    for mode in MODES:
+        env = {
+            **os.environ,
+            "NETAUTO_TASK_MODE": mode,
+            "PREFECT_LOGGING_LEVEL": "WARNING",
+            "F5_USERNAME": "benchmark",
+            "F5_PASSWORD": "benchmark",
+        }
+        child = subprocess.run(
+            [sys.executable, "-m", "benchmarks.orchestration", "--child", "--events", str(args.events)],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        results[mode] = json.loads(child.stdout.strip().splitlines()[-1])
+
+    print(f"deploy_as3_application orchestration overhead, {args.events} sequential events")
+    for mode, stats in results.items():
+        print(f"  {mode:<8}" + "".join(f"{k}={v:9.2f}  " for k, v in stats.items()))
+    saved = results["task"]["mean_ms"] - results["inline"]["mean_ms"]
+    print(f"  inline saves {saved:.2f} ms per event ({saved / results['task']['mean_ms'] * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+End-to-end benchmark of the webhook, deploy and ticket flows against local fakes.
+
+Events are sent open-loop at a fixed rate; latency is measured from each event's
+scheduled send time to the completion of its flow, so falling behind shows up
+as latency. Results are appended to benchmarks/results/<scenario>.jsonl together
+with the git commit, and compared with the previous run of the same configuration.
+
+Usage:
+    python -m benchmarks.run deploy --events 200 --rate 20 --as3-latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+from unittest import mock
+
+from benchmarks.fakes import FakeAS3Server, FakeInfrahub, isolate_local_state
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def artifact_event(target_id: str, storage_id: str) -> dict[str, Any]:
+    return {
+        "id": str(uuid.uuid4()),
+        "data": {
+            "node_id": str(uuid.uuid4()),
+            "checksum": uuid.uuid4().hex,
+            "target_id": target_id,
+            "storage_id": storage_id,
+            "target_kind": "NetautoFlexApplication",
+            "checksum_previous": uuid.uuid4().hex,
+            "storage_id_previous": storage_id,
+            "artifact_definition_id": "188023e7-302d-7ff3-e387-c51754f3090c",
+        },
+        "event": "infrahub.artifact.updated",
+        "branch": "main",
+        "account_id": "benchmark",
+        "occured_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def ticket_event(ritm: str, cat_item: str = "segment") -> dict[str, Any]:
+    node_id = str(uuid.uuid4())
+    attributes = {
+        "ritm": ritm,
+        "cat_item": cat_item,
+        "short_description": f"Segment Service Request (NEW) - {ritm}",
+    }
+    return {
+        "id": str(uuid.uuid4()),
+        "data": {
+            "kind": "NetautoServiceNowTicket",
+            "action": "created",
+            "node_id": node_id,
+            "changelog": {
+                "node_id": node_id,
+                "node_kind": "NetautoServiceNowTicket",
+                "display_label": ritm,
+                "attributes": {
+                    name: {"kind": "Text", "name": name, "value": value} for name, value in attributes.items()
+                },
+                "relationships": {},
+            },
+        },
+        "event": "infrahub.node.created",
+        "branch": "main",
+        "account_id": "benchmark",
+        "occured_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def build_events(
+    scenario: str, count: int, infrahub: FakeInfrahub, as3: FakeAS3Server | list[FakeAS3Server], applications: int
+) -> list[dict]:
+    """Events for applications deployed to as3, or to every server when given a list."""
+    address = [server.address for server in as3] if isinstance(as3, list) else as3.address
+    apps = [infrahub.add_application(address) for _ in range(applications)]
+    events = []
+    for i in range(count):
+        application, storage_id = apps[i % len(apps)]
+        if scenario == "deploy" or (scenario == "webhook" and i % 2 == 0):
+            events.append(artifact_event(application.id, storage_id))
+        else:
+            events.append(ticket_event(f"RITM{i:07d}"))
+    return events
+
+
+def scenario_call(scenario: str) -> Callable[[dict], Awaitable[Any]]:
+    from flows.models import WebhookPayload
+
+    if scenario == "webhook":
+        from flows.webhook_handler import webhook_handler
+
+        return webhook_handler
+    if scenario == "deploy":
+        from flows.deploy_as3_application import deploy_as3_application
+
+        return deploy_as3_application
+    from flows.handle_ticket_created import handle_ticket_created
+
+    return lambda event: handle_ticket_created(WebhookPayload.model_validate(event))
+
+
+def patch_clients(infrahub: FakeInfrahub) -> ExitStack:
+    """Point every place the flows build an Infrahub client at the fake."""
+    stack = ExitStack()
+    for target in (
+        "flows.deploy_as3_application.get_infrahub_client",
+        "flows.handle_ticket_created._build_infrahub_client",
+    ):
+        stack.enter_context(mock.patch(target, lambda: infrahub))
+    return stack
+
+
+async def drive(call: Callable[[dict], Awaitable[Any]], events: list[dict], rate: float) -> tuple[list[float], int, float]:
+    """Send events open-loop at rate/s. Returns latencies of successful events, error count and wall time."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    async def send(i: int, event: dict) -> float:
+        scheduled = start + i / rate
+        await asyncio.sleep(max(0.0, scheduled - loop.time()))
+        await call(event)
+        return loop.time() - scheduled
+
+    outcomes = await asyncio.gather(*(send(i, e) for i, e in enumerate(events)), return_exceptions=True)
+    elapsed = loop.time() - start
+    latencies = [o for o in outcomes if isinstance(o, float)]
+    errors = [o for o in outcomes if isinstance(o, BaseException)]
+    if errors:
+        print(f"{len(errors)} events failed, first error: {errors[0]!r}", file=sys.stderr)
+    return latencies, len(errors), elapsed
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(pct) - 1]
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"], capture_output=True).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def save_result(scenario: str, record: dict[str, Any]) -> dict[str, Any] | None:
+    """Append record to the scenario history and return the previous run with the same config."""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{scenario}.jsonl")
+    previous = None
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["config"] == record["config"]:
+                    previous = entry
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    return previous
+
+
+def report(record: dict[str, Any], previous: dict[str, Any] | None) -> None:
+    results = record["results"]
+    print(f"\n{record['scenario']} @ {record['commit']}: {json.dumps(record['config'])}")
+    for key in ("p50_ms", "p99_ms", "events_per_sec", "errors"):
+        line = f"  {key:<16}{results[key]:>12.2f}"
+        if previous:
+            before = previous["results"][key]
+            change = (results[key] - before) / before * 100 if before else 0.0
+            line += f"   (was {before:.2f} @ {previous['commit']}, {change:+.1f}%)"
+        print(line)
+    for backend, counts in results["requests"].items():
+        print(f"  {backend:<16}{json.dumps(counts)}")
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    infrahub = FakeInfrahub(latency=args.infrahub_latency)
+    with ExitStack() as stack:
+        servers = [stack.enter_context(FakeAS3Server(latency=args.as3_latency)) for _ in range(args.clusters)]
+        stack.enter_context(patch_clients(infrahub))
+        as3 = servers if args.clusters > 1 else servers[0]
+        events = build_events(args.scenario, args.events, infrahub, as3, args.applications)
+        call = scenario_call(args.scenario)
+        # Warm up once so Prefect's temporary API server start is not counted.
+        await call(build_events(args.scenario, 1, infrahub, as3, 1)[0])
+        infrahub.requests.clear()
+        for server in servers:
+            server.requests.clear()
+
+        latencies, errors, elapsed = await drive(call, events, args.rate)
+
+    as3_requests: Counter[str] = Counter()
+    for server in servers:
+        as3_requests.update(server.requests)
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "events_per_sec": len(latencies) / elapsed,
+        "errors": errors,
+        "requests": {"infrahub": dict(infrahub.requests), "as3": dict(as3_requests)},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", choices=["webhook", "deploy", "ticket"])
+    parser.add_argument("--events", type=int, default=100, help="number of events to send")
+    parser.add_argument("--rate", type=float, default=10.0, help="events per second")
+    parser.add_argument("--applications", type=int, default=10, help="distinct applications to deploy")
+    parser.add_argument("--clusters", type=int, default=1, help="clusters (fake AS3 servers) per application")
+    parser.add_argument("--infrahub-latency", type=float, default=0.005, help="seconds added per Infrahub request")
+    parser.add_argument("--as3-latency", type=float, default=0.02, help="seconds added per AS3 request")
+    parser.add_argument("--no-save", action="store_true", help="do not record the result")
+    args = parser.parse_args()
+
+    isolate_local_state(args.scenario)
+    os.environ.setdefault("PREFECT_LOGGING_LEVEL", "WARNING")
+    os.environ.setdefault("F5_USERNAME", "benchmark")
+    os.environ.setdefault("F5_PASSWORD", "benchmark")
+
+    record = {
+        "scenario": args.scenario,
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            **{k: v for k, v in vars(args).items() if k not in ("scenario", "no_save")},
+            "task_mode": os.getenv("NETAUTO_TASK_MODE", "task"),
+        },
+        "results": asyncio.run(run(args)),
+    }
+    previous = None if args.no_save else save_result(args.scenario, record)
+    report(record, previous)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,23 @@ import os
 
 from infrahub_sdk import Config, InfrahubClient
 
+_client: InfrahubClient | None = None
+
 
 def get_infrahub_client() -> InfrahubClient:
-    return InfrahubClient(
+    """
+    Build an Infrahub client from the environment.
+
+    With INFRAHUB_CLIENT_REUSE=true one client (and its schema cache) is kept
+    for the life of the process, as the warm runner does.
+    """
+    global _client
+    if _client is not None:
+        return _client
+    client = InfrahubClient(
         address=os.environ["INFRAHUB_API_URL"],
         config=Config(api_token=os.environ["INFRAHUB_API_TOKEN"]),
     )
+    if os.getenv("INFRAHUB_CLIENT_REUSE", "false").lower() in ("1", "true", "yes"):
+        _client = client
+    return client
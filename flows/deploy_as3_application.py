@@ -1,19 +1,28 @@
-from prefect import flow, get_run_logger
+from prefect import flow, task, get_run_logger
 from typing import Dict
 import asyncio
-import json
+from dataclasses import dataclass
 import os
-import sys
 import urllib3
 import requests
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from tasks.common import validate_webhook_data, fetch_infrahub_artifact, set_node_deployment_status, DeploymentStatus
+from flows.priority import timed_by_priority
+from tasks.common import validate_webhook_data, set_node_deployment_status, DeploymentStatus
+from tasks.artifacts import PreparedDeclaration, fetch_rendered_artifact
+from tasks.metrics import stage, external_call
+from tasks.cache import DEPLOY_CACHE_TTL, deploy_cached, keyed_on_deploy
+from tasks.declaration_store import DeclarationStore
+from tasks.backends import RequestRejected, f5_backend, infrahub_backend
 from blocks.blocks import get_infrahub_client
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+FLOW_NAME = "deploy-as3-application"
+
+
+class AS3DeclarationRejected(RequestRejected, RuntimeError):
+    """AS3 refused the declaration with a 4xx; the device itself is reachable and healthy."""
+
 
 def _f5_login(cluster_ip: str, username: str, password: str, timeout: int = 30) -> str:
     r = requests.post(
@@ -42,66 +51,284 @@ def _ensure_per_app(cluster_ip: str, headers: dict, timeout: int = 30) -> None:
         r.raise_for_status()
 
 
-def _post_app(cluster_ip: str, headers: dict, tenant: str, payload: dict, timeout: int = 120) -> dict:
-    r = requests.post(
-        f"https://{cluster_ip}/mgmt/shared/appsvcs/declare/{tenant}/applications",
-        headers=headers,
-        json=payload,
-        verify=False,
-        timeout=timeout,
-    )
+# Per device, whether it accepted a gzip-encoded declaration (AS3_GZIP=auto)
+_gzip_supported: dict[str, bool] = {}
+# Per device, rejected gzip posts that did not tell whether gzip was the reason
+_gzip_probes: dict[str, int] = {}
+GZIP_PROBES = int(os.getenv("AS3_GZIP_PROBES", "3"))
+
+
+def _gzip_mode() -> str:
+    mode = os.getenv("AS3_GZIP", "false").lower()
+    if mode in ("1", "true", "yes"):
+        return "true"
+    return "auto" if mode == "auto" else "false"
+
+
+def _use_gzip(cluster_ip: str) -> bool:
+    """
+    AS3_GZIP=false (default) never compresses, true always does. auto compresses
+    until a device is found not to accept it, and remembers the outcome per device.
+    A device that rejects AS3_GZIP_PROBES gzip posts without settling it is no
+    longer sent gzip, so rejected declarations are not posted twice indefinitely.
+    """
+    mode = _gzip_mode()
+    if mode == "auto":
+        return _gzip_supported.get(cluster_ip, True)
+    return mode == "true"
+
+
+def _send_declaration(url: str, headers: dict, declaration: PreparedDeclaration, gzip: bool, timeout: int):
+    if gzip:
+        headers = {**headers, "Content-Encoding": "gzip"}
+        body = declaration.compressed
+    else:
+        body = declaration.body()
+    return requests.post(url, headers=headers, data=body, verify=False, timeout=timeout)
+
+
+def _post_app(cluster_ip: str, headers: dict, tenant: str, payload: PreparedDeclaration | dict, timeout: int = 120) -> dict:
+    declaration = payload if isinstance(payload, PreparedDeclaration) else PreparedDeclaration.from_dict(payload)
+    url = f"https://{cluster_ip}/mgmt/shared/appsvcs/declare/{tenant}/applications"
+    gzip = _use_gzip(cluster_ip)
+    r = _send_declaration(url, headers, declaration, gzip, timeout)
+    if gzip and 400 <= r.status_code < 500 and cluster_ip not in _gzip_supported and _gzip_mode() == "auto":
+        # 415 says the encoding is not supported. A device that cannot decode the body may also answer 400 or 422,
+        # like one rejecting the declaration itself; only an uncompressed retry that succeeds tells them apart.
+        unsupported = r.status_code == 415
+        r = _send_declaration(url, headers, declaration, False, timeout)
+        if unsupported or r.ok:
+            _gzip_supported[cluster_ip] = False
+        else:
+            _gzip_probes[cluster_ip] = _gzip_probes.get(cluster_ip, 0) + 1
+            if _gzip_probes[cluster_ip] >= GZIP_PROBES:
+                _gzip_supported[cluster_ip] = False
+    elif gzip and r.ok:
+        _gzip_supported[cluster_ip] = True
     if not r.ok:
         try:
             detail = r.json()
         except ValueError:
             detail = r.text
-        raise RuntimeError(f"AS3 deploy failed ({r.status_code}): {detail}")
+        error = AS3DeclarationRejected if r.status_code < 500 else RuntimeError
+        raise error(f"AS3 deploy failed ({r.status_code}): {detail}")
     try:
         return r.json()
     except ValueError:
         return {}
 
 
-def deploy_as3(cluster_ip: str, tenant: str, payload: dict) -> dict:
+def deploy_as3(cluster_ip: str, tenant: str, payload: PreparedDeclaration | dict) -> dict:
     username = os.getenv("F5_USERNAME")
     password = os.getenv("F5_PASSWORD")
-    token = _f5_login(cluster_ip, username, password)
+    with stage(FLOW_NAME, "f5_login"), external_call("f5", "login"):
+        token = _f5_login(cluster_ip, username, password)
     headers = {"Content-Type": "application/json", "X-F5-Auth-Token": token}
-    _ensure_per_app(cluster_ip, headers)
-    return _post_app(cluster_ip, headers, tenant, payload)
+    with stage(FLOW_NAME, "as3_settings"), external_call("f5", "settings"):
+        _ensure_per_app(cluster_ip, headers)
+    with stage(FLOW_NAME, "as3_post"), external_call("f5", "declare"):
+        return _post_app(cluster_ip, headers, tenant, payload)
+
+
+def _get_declarations(cluster_ip: str, headers: dict, timeout: int = 120) -> dict:
+    r = requests.get(f"https://{cluster_ip}/mgmt/shared/appsvcs/declare", headers=headers, verify=False, timeout=timeout)
+    r.raise_for_status()
+    # 204 when nothing is declared on the device
+    return r.json() if r.status_code != 204 and r.content else {}
+
+
+def fetch_deployed_declarations(cluster_ip: str) -> dict:
+    """Every tenant declared on the device, in one AS3 call."""
+    username = os.getenv("F5_USERNAME")
+    password = os.getenv("F5_PASSWORD")
+    with external_call("f5", "login"):
+        token = _f5_login(cluster_ip, username, password)
+    headers = {"Content-Type": "application/json", "X-F5-Auth-Token": token}
+    with external_call("f5", "get_declarations"):
+        return _get_declarations(cluster_ip, headers)
+
+
+@task(cache_policy=keyed_on_deploy(), cache_expiration=DEPLOY_CACHE_TTL, persist_result=True)
+async def deploy_as3_declaration(
+    cluster_ip: str, tenant: str, payload: PreparedDeclaration, target_id: str, checksum: str, cluster: str | None = None
+) -> dict:
+    """
+    Post the declaration to the device, on the executor of its cluster. Cached per
+    (target_id, checksum, device) and the device's generation in the declaration
+    store, so a retried or duplicate run of the latest artifact returns the stored
+    AS3 response, but going back to an earlier artifact posts it again.
+    """
+    return await f5_backend(cluster or cluster_ip).run(deploy_as3, cluster_ip, tenant, payload)
+
+
+@dataclass(frozen=True)
+class DeployTarget:
+    cluster: str
+    address: str
+
+
+async def _fetch(relationship) -> None:
+    with external_call("infrahub", "fetch"):
+        await relationship.fetch()
+
+
+async def _primary_address(node) -> str:
+    await _fetch(node.primary_address)
+    return str(node.primary_address.peer.address.value.ip)
+
+
+async def _cluster_targets(cluster) -> list[DeployTarget]:
+    name = cluster.name.value if getattr(cluster, "name", None) is not None else cluster.id
+    members = getattr(cluster, "members", None)
+    if members is not None and os.getenv("AS3_DEPLOY_ALL_MEMBERS", "false").lower() in ("1", "true", "yes"):
+        await _fetch(members)
+        addresses = await asyncio.gather(*(_primary_address(member.peer) for member in members.peers))
+        return [DeployTarget(name, address) for address in addresses]
+    return [DeployTarget(name, await _primary_address(cluster))]
+
+
+async def resolve_deploy_targets(application) -> list[DeployTarget]:
+    """
+    Every device to deploy the application to: the primary address of each of
+    its clusters (f5_clusters if the application has it, else f5_cluster), or of
+    each cluster member with AS3_DEPLOY_ALL_MEMBERS=true.
+    """
+    clusters_many = getattr(application, "f5_clusters", None)
+    if clusters_many is not None:
+        await _fetch(clusters_many)
+        clusters = [related.peer for related in clusters_many.peers]
+    else:
+        await _fetch(application.f5_cluster)
+        clusters = [application.f5_cluster.peer]
+    per_cluster = await asyncio.gather(*(_cluster_targets(cluster) for cluster in clusters))
+    return [target for targets in per_cluster for target in targets]
+
+
+async def deploy_to_target(target: DeployTarget, tenant: str, payload: PreparedDeclaration, target_id: str, checksum: str) -> dict:
+    return await deploy_as3_declaration(target.address, tenant, payload, target_id, checksum, cluster=target.cluster)
+
+
+async def latest_deploy_cached(targets: list[DeployTarget], target_id: str, checksum: str) -> bool:
+    """
+    Whether checksum is the last known good declaration on every device and its
+    posts are still cached: a retry or duplicate delivery that would post nothing.
+    """
+    store = DeclarationStore()
+    if not targets or any((store.get(target_id, t.address) or {}).get("checksum") != checksum for t in targets):
+        return False
+    hits = await asyncio.gather(*(deploy_cached(deploy_as3_declaration, target_id, checksum, t.address) for t in targets))
+    return all(hits)
+
+
+def combine_statuses(statuses: list[DeploymentStatus]) -> DeploymentStatus:
+    """One status for a multi-device deploy: deployed only if every device is."""
+    if not statuses:
+        return DeploymentStatus.unknown
+    if all(s == DeploymentStatus.deployed for s in statuses):
+        return DeploymentStatus.deployed
+    return DeploymentStatus.failed
 
 
 @flow()
+@timed_by_priority
 async def deploy_as3_application(webhook_data: Dict):
     logger = get_run_logger()
     logger.info("Processing AS3 Application webhook data...")
 
     # Validate the incoming webhook data
-    webhook_data = validate_webhook_data(webhook_data)
+    with stage(FLOW_NAME, "validate"):
+        webhook_data = validate_webhook_data(webhook_data)
 
     infc = get_infrahub_client()
-    logger.info(await infc.get_version())
+    with external_call("infrahub", "get_version"):
+        logger.info(await infc.get_version())
+
+    with stage(FLOW_NAME, "status_running"):
+        await set_node_deployment_status(infc, webhook_data.data.target_kind, webhook_data.data.target_id, DeploymentStatus.running)
 
-    set_node_deployment_status(infc, webhook_data.data.target_kind, webhook_data.data.target_id, DeploymentStatus.running)
+    # Resolve every device the application is deployed to
+    with stage(FLOW_NAME, "resolve_target"):
+        async with infrahub_backend().guard():
+            with external_call("infrahub", "get"):
+                application = await infc.get(kind=webhook_data.data.target_kind, id=webhook_data.data.target_id)
+            targets = await resolve_deploy_targets(application)
+            with external_call("infrahub", "fetch"):
+                await application.entity.fetch()
+            entity = application.entity.peer.name.value
 
-    # Fetch target cluster management IP and entity for target application
-    application = await infc.get(kind=webhook_data.data.target_kind, id=webhook_data.data.target_id)
-    await application.f5_cluster.fetch()
-    await application.f5_cluster.peer.primary_address.fetch()
-    cluster_ip = str(application.f5_cluster.peer.primary_address.peer.address.value.ip)
-    await application.entity.fetch()
-    entity = application.entity.peer.name.value
+    # Checked before the artifact is streamed; resolving the devices above is still needed to know what to check
+    if await latest_deploy_cached(targets, webhook_data.data.target_id, webhook_data.data.checksum):
+        logger.info(f"Checksum {webhook_data.data.checksum} is already deployed to every device, not deploying it again")
+        with stage(FLOW_NAME, "status_deployed"):
+            await set_node_deployment_status(
+                infc, webhook_data.data.target_kind, webhook_data.data.target_id, DeploymentStatus.deployed
+            )
+        return
 
-    # Fetch the payload for the Application
-    payload = await fetch_infrahub_artifact(infc, webhook_data.data.storage_id)
+    # Stream the payload for the Application, rendering the checksum placeholder on the way
+    with stage(FLOW_NAME, "fetch_artifact"):
+        payload = await fetch_rendered_artifact(
+            infc, webhook_data.data.storage_id, {"XXXXXX": webhook_data.data.checksum[:6]}
+        )
+
+    logger.info(f"Deploying AS3 application to {len(targets)} device(s): {', '.join(t.address for t in targets)} (tenant={entity})")
+    with stage(FLOW_NAME, "deploy"):
+        outcomes = await asyncio.gather(
+            *(deploy_to_target(target, entity, payload, webhook_data.data.target_id, webhook_data.data.checksum) for target in targets),
+            return_exceptions=True,
+        )
 
-    payload = json.loads(json.dumps(payload).replace("XXXXXX", webhook_data.data.checksum[:6]))
+    statuses = []
+    for target, outcome in zip(targets, outcomes):
+        if isinstance(outcome, BaseException):
+            logger.error(f"AS3 deploy to {target.address} ({target.cluster}) failed: {outcome}")
+            statuses.append(DeploymentStatus.failed)
+        else:
+            logger.info(f"AS3 deploy response from {target.address} ({target.cluster}): {outcome}")
+            statuses.append(DeploymentStatus.deployed)
 
-    logger.info(f"Deploying AS3 application to cluster at {cluster_ip} (tenant={entity})")
-    result = await asyncio.to_thread(deploy_as3, cluster_ip, entity, payload)
-    logger.info(f"AS3 deploy response: {result}")
+    status = combine_statuses(statuses)
+    if status != DeploymentStatus.deployed:
+        # No device is recorded as last known good, so a rollback restores the whole application to one version.
+        # Devices that took the declaration no longer match their record; their cached posts must not be reused.
+        store = DeclarationStore()
+        for target, s in zip(targets, statuses):
+            if s == DeploymentStatus.deployed:
+                store.invalidate(webhook_data.data.target_id, target.address)
+        failed = [t.address for t, s in zip(targets, statuses) if s != DeploymentStatus.deployed]
+        raise RuntimeError(f"AS3 deploy failed on {len(failed)} of {len(targets)} device(s): {', '.join(failed)}")
 
-    set_node_deployment_status(infc, webhook_data.data.target_kind, webhook_data.data.target_id, DeploymentStatus.deployed)
+    store = DeclarationStore()
+    for target in targets:
+        store.save(webhook_data.data.target_id, target.address, target.cluster, entity, webhook_data.data.checksum, payload)
+
+    with stage(FLOW_NAME, "status_deployed"):
+        await set_node_deployment_status(infc, webhook_data.data.target_kind, webhook_data.data.target_id, status)
+
+
+async def rollback_to_last_known_good(target_id: str, failed_checksum: str | None = None) -> list[dict]:
+    """
+    Re-post the last successfully applied declaration of target_id to every
+    device it is recorded for, skipping devices where failed_checksum is
+    already the last known good one.
+    """
+    logger = get_run_logger()
+    rolled_back = []
+    store = DeclarationStore()
+    for record in store.for_target(target_id):
+        if failed_checksum and record["checksum"] == failed_checksum:
+            logger.info(f"Checksum {failed_checksum} is already the last known good on {record['address']}, not rolling back")
+            continue
+        logger.info(
+            f"Re-posting last known good declaration {record['checksum']} to {record['address']} "
+            f"({record['cluster']}, tenant={record['tenant']})"
+        )
+        with stage(FLOW_NAME, "rollback"):
+            await f5_backend(record["cluster"]).run(deploy_as3, record["address"], record["tenant"], store.declaration(record))
+        rolled_back.append({"address": record["address"], "cluster": record["cluster"], "checksum": record["checksum"]})
+    if not rolled_back:
+        logger.warning(f"No last known good declaration to roll back to for {target_id}")
+    return rolled_back
 
 
 @deploy_as3_application.on_failure
@@ -111,7 +338,12 @@ async def deploy_as3_application_failed(flow, flow_run, state):
     logger.info(f"Flow run parameters: {flow_run.parameters}")
     client = get_infrahub_client()
     webhook_data = validate_webhook_data(flow_run.parameters.get("webhook_data", {}))
-    set_node_deployment_status(client, webhook_data.data.target_kind, webhook_data.data.target_id, DeploymentStatus.failed)
+    await set_node_deployment_status(client, webhook_data.data.target_kind, webhook_data.data.target_id, DeploymentStatus.failed)
+
+    if os.getenv("AS3_AUTO_ROLLBACK", "false").lower() in ("1", "true", "yes"):
+        await rollback_to_last_known_good(webhook_data.data.target_id, failed_checksum=webhook_data.data.checksum)
+    else:
+        logger.info(f"Run rollback-as3-application for {webhook_data.data.target_id} to restore the last known good declaration")
 
 
 if __name__ == "__main__":
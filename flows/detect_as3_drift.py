@@ -0,0 +1,137 @@
+"""
+Flow to detect AS3 applications that no longer match what was deployed.
+
+Fetches the deployed declarations once per device (one AS3 call however many
+applications it runs), hashes every application in canonical form and compares
+it with the digest of the last known good declaration recorded for it (see
+tasks.declaration_store). Drifted applications, changed by hand or removed from
+the device, are reported. With redeploy=True the declarations of changed ones are
+re-posted from the store; removed ones may have been removed on purpose and are
+only reported.
+
+The store is local to the worker, so AS3_DECLARATION_STORE must be a volume
+shared with the workers that run deploys. An empty store fails the run rather
+than reporting no drift.
+"""
+import asyncio
+from collections import defaultdict
+
+from prefect import flow, get_run_logger
+
+from flows.deploy_as3_application import deploy_as3, fetch_deployed_declarations
+from tasks.backends import f5_backend
+from tasks.declaration_store import DeclarationStore, application_digests
+from tasks.metrics import stage
+
+FLOW_NAME = "detect-as3-drift"
+
+
+def find_drift(store: DeclarationStore, records: list[dict], deployed: dict) -> list[dict]:
+    """Applications of records whose digest differs from, or is missing in, the deployed declarations of their device."""
+    actual = {
+        tenant: application_digests(declaration)
+        for tenant, declaration in deployed.items()
+        if isinstance(declaration, dict) and declaration.get("class") == "Tenant"
+    }
+    drifted = []
+    for record in records:
+        on_device = actual.get(record["tenant"], {})
+        for application, digest in store.digests(record).items():
+            if on_device.get(application) != digest:
+                drifted.append(
+                    {
+                        "target_id": record["target_id"],
+                        "address": record["address"],
+                        "cluster": record["cluster"],
+                        "tenant": record["tenant"],
+                        "application": application,
+                        "checksum": record["checksum"],
+                        "reason": "missing" if application not in on_device else "changed",
+                    }
+                )
+    return drifted
+
+
+async def check_device(store: DeclarationStore, address: str, records: list[dict]) -> list[dict]:
+    # On the executor and breaker of the device's cluster, like its deploys
+    deployed = await f5_backend(records[0]["cluster"]).run(fetch_deployed_declarations, address)
+    return find_drift(store, records, deployed)
+
+
+@flow(name=FLOW_NAME)
+async def detect_as3_drift(redeploy: bool = False) -> list[dict]:
+    logger = get_run_logger()
+    store = DeclarationStore()
+
+    records = store.records()
+    if not records:
+        raise RuntimeError(
+            f"No last known good declarations in {store.root}: nothing to check. "
+            "AS3_DECLARATION_STORE must be a volume shared with the workers that run deploys"
+        )
+    by_device: dict[str, list[dict]] = defaultdict(list)
+    for record in records:
+        by_device[record["address"]].append(record)
+    logger.info(f"Checking {sum(map(len, by_device.values()))} deployed application(s) on {len(by_device)} device(s) for drift")
+
+    with stage(FLOW_NAME, "compare"):
+        outcomes = await asyncio.gather(
+            *(check_device(store, address, records) for address, records in by_device.items()),
+            return_exceptions=True,
+        )
+
+    drifted = []
+    unreachable = []
+    for address, outcome in zip(by_device, outcomes):
+        if isinstance(outcome, BaseException):
+            logger.error(f"Could not fetch deployed declarations from {address}: {outcome}")
+            unreachable.append(address)
+        else:
+            drifted.extend(outcome)
+    for drift in drifted:
+        logger.warning(
+            f"Drift on {drift['address']} ({drift['cluster']}): {drift['tenant']}/{drift['application']} {drift['reason']} "
+            f"(target {drift['target_id']}, last deployed checksum {drift['checksum']})"
+        )
+    logger.info(f"{len(drifted)} drifted application(s)")
+    # A drifted device no longer runs its recorded declaration, so a deploy of the same checksum must post again
+    for target_id, address in {(d["target_id"], d["address"]) for d in drifted}:
+        store.invalidate(target_id, address)
+
+    # One post per declaration with a changed application, even if several of them changed
+    to_redeploy = {(d["target_id"], d["address"]): d for d in drifted if d["reason"] == "changed"}
+    if redeploy:
+        for d in drifted:
+            if (d["target_id"], d["address"]) not in to_redeploy:
+                logger.warning(
+                    f"Not redeploying {d['tenant']}/{d['application']} to {d['address']}: "
+                    "it is missing from the device and may have been removed on purpose"
+                )
+    if redeploy and to_redeploy:
+        with stage(FLOW_NAME, "redeploy"):
+            results = await asyncio.gather(
+                *(
+                    f5_backend(d["cluster"]).run(
+                        deploy_as3, address, d["tenant"], store.declaration(store.get(target_id, address))
+                    )
+                    for (target_id, address), d in to_redeploy.items()
+                ),
+                return_exceptions=True,
+            )
+        failed = 0
+        for (target_id, address), result in zip(to_redeploy, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Redeploying {target_id} to {address} failed: {result}")
+                failed += 1
+            else:
+                logger.info(f"Redeployed last known good declaration of {target_id} to {address}")
+        if failed:
+            raise RuntimeError(f"Redeploying {failed} of {len(to_redeploy)} drifted declaration(s) failed")
+
+    if unreachable:
+        raise RuntimeError(f"Drift check incomplete, {len(unreachable)} device(s) unreachable: {', '.join(unreachable)}")
+    return drifted
+
+
+if __name__ == "__main__":
+    asyncio.run(detect_as3_drift())
@@ -12,16 +12,27 @@ from prefect.cache_policies import NONE
 
 from blocks.blocks import get_infrahub_client as _build_infrahub_client
 from flows.models import WebhookPayload
+from flows.priority import timed_by_priority
+from tasks.metrics import stage, external_call
+from tasks.execution import hot_task
+from tasks.cache import TICKET_CACHE_TTL, keyed_on_ticket
+from tasks.backends import infrahub_backend
 
 from infrahub_sdk.protocols import CoreProposedChange
 from infrahub_sdk.exceptions import BranchNotFoundError
 
+FLOW_NAME = "handle-ticket-created"
 
-@task
+TICKET_CACHE = keyed_on_ticket()
+
+
+@hot_task
 async def get_infrahub_client():
     logger = get_run_logger()
     client = _build_infrahub_client()
-    version = await client.get_version()
+    async with infrahub_backend().guard():
+        with external_call("infrahub", "get_version"):
+            version = await client.get_version()
     logger.info(f"Connected to Infrahub: {version}")
     return client
 
@@ -31,7 +42,7 @@ async def get_snow_client():
     # TODO: Implement ServiceNow client block and loading
     pass
 
-@task(cache_policy=NONE)
+@task(cache_policy=TICKET_CACHE, cache_expiration=TICKET_CACHE_TTL, persist_result=True)
 async def create_ticket_branch(client, ticket_id: str, ritm: str) -> str:
     """Create a new branch for implementing the ticket."""
     logger = get_run_logger()
@@ -39,32 +50,47 @@ async def create_ticket_branch(client, ticket_id: str, ritm: str) -> str:
     logger.info(f"Creating branch: {branch_name}")
 
     # Create branch in Infrahub if it does not exist
-    try:
-        existing_branch = await client.branch.get(branch_name=branch_name)
+    async with infrahub_backend().guard():
+        with external_call("infrahub", "branch_get"):
+            try:
+                existing_branch = await client.branch.get(branch_name=branch_name)
+            except BranchNotFoundError:
+                existing_branch = None  # Branch does not exist, proceed to create
+    if existing_branch is not None:
         logger.info(f"Branch already exists: {existing_branch.name}")
         return existing_branch.name
-    except BranchNotFoundError:
-        pass  # Branch does not exist, proceed to create
 
-    branch = await client.branch.create(
-        branch_name=branch_name,
-        description=f"Implementation branch for ticket {ritm}",
-        sync_with_git=False,
-    )
+    async with infrahub_backend().guard():
+        with external_call("infrahub", "branch_create"):
+            branch = await client.branch.create(
+                branch_name=branch_name,
+                description=f"Implementation branch for ticket {ritm}",
+                sync_with_git=False,
+            )
     logger.info(f"Branch created: {branch.name}")
     return branch.name
 
 
+# Not cached: the details are live Infrahub nodes, which are not worth persisting.
 @task(cache_policy=NONE)
 async def fetch_ticket_details(client, ritm: str) -> dict[str, Any]:
     """Fetch full ticket details from SNOW."""
     # Placeholder implementation - replace with actual SNOW API calls
     # Return static segment data for now
+    async with infrahub_backend().guard():
+        with external_call("infrahub", "get"):
+            entity = await client.get(kind="OrganizationEntity", name__value="Bank")
+        with external_call("infrahub", "get"):
+            pillar = await client.get(kind="NetautoPillar", name__value="Prod")
+        with external_call("infrahub", "get"):
+            firewall_device = await client.get(kind="InfraDevice", name__value="cz-fw-1")
+        with external_call("infrahub", "get"):
+            country = await client.get(kind="LocationCountry", shortname__value="CZ")
     ticket_details = {
-        "entity": await client.get(kind="OrganizationEntity", name__value="Bank"),
-        "pillar": await client.get(kind="NetautoPillar", name__value="Prod"),
-        "firewall_device": await client.get(kind="InfraDevice", name__value="cz-fw-1"),
-        "country": await client.get(kind="LocationCountry", shortname__value="CZ"),
+        "entity": entity,
+        "pillar": pillar,
+        "firewall_device": firewall_device,
+        "country": country,
         "network_category": "production",
         "filtering_profile": "X",
         "network_zone": "perimeter",
@@ -75,7 +101,7 @@ async def fetch_ticket_details(client, ritm: str) -> dict[str, Any]:
     return ticket_details
 
 
-@task(cache_policy=NONE)
+@task(cache_policy=TICKET_CACHE, cache_expiration=TICKET_CACHE_TTL, persist_result=True)
 async def implement_segment_service(client, ticket_details: dict[str, Any], branch: str, ritm: str):
     """
     Implement a segment service request on the given branch.
@@ -88,7 +114,9 @@ async def implement_segment_service(client, ticket_details: dict[str, Any], bran
         data=ticket_details,
         branch=branch,
     )
-    await service.save(allow_upsert=True)
+    async with infrahub_backend().guard():
+        with external_call("infrahub", "save"):
+            await service.save(allow_upsert=True)
 
     logger.info(f"Creating proposed change for segment service ticket {ritm}")
     proposed_change_dict: dict = {
@@ -101,12 +129,14 @@ async def implement_segment_service(client, ticket_details: dict[str, Any], bran
         data=proposed_change_dict,
         branch=branch,
     )
-    await proposed_change.save(allow_upsert=True)
+    async with infrahub_backend().guard():
+        with external_call("infrahub", "save"):
+            await proposed_change.save(allow_upsert=True)
 
     logger.info(f"Segment service for ticket {ritm} created successfully on branch {branch}")
 
 
-@task(cache_policy=NONE)
+@task(cache_policy=TICKET_CACHE, cache_expiration=TICKET_CACHE_TTL, persist_result=True)
 async def implement_application_service(client, ticket: dict[str, Any], branch: str):
     """
     Implement an application (F5) service request on the given branch.
@@ -140,6 +170,7 @@ async def implement_application_service(client, ticket: dict[str, Any], branch:
 
 
 @flow(name="handle-ticket-created")
+@timed_by_priority
 async def handle_ticket_created(payload: WebhookPayload) -> dict[str, Any]:
     """
     Main flow to handle ticket created events.
@@ -160,21 +191,25 @@ async def handle_ticket_created(payload: WebhookPayload) -> dict[str, Any]:
     logger.info(f"Description: {short_desc}")
 
     # Connect to Infrahub
-    client = await get_infrahub_client()
+    with stage(FLOW_NAME, "connect"):
+        client = await get_infrahub_client()
 
     # Create branch for this ticket
-    branch = await create_ticket_branch(client, node_id, ritm)
+    with stage(FLOW_NAME, "create_branch"):
+        branch = await create_ticket_branch(client, node_id, ritm)
 
     # Fetch full ticket details
-    ticket_details = await fetch_ticket_details(client, ritm)
+    with stage(FLOW_NAME, "fetch_ticket_details"):
+        ticket_details = await fetch_ticket_details(client, ritm)
 
     # Route to appropriate implementation based on category
-    if cat_item == "segment":
-        await implement_segment_service(client, ticket_details, branch, ritm)
-    elif cat_item == "application":
-        await implement_application_service(client, ticket_details, branch)
-    else:
-        logger.warning(f"Unknown cat_item: {cat_item}, skipping implementation")
+    with stage(FLOW_NAME, "implement"):
+        if cat_item == "segment":
+            await implement_segment_service(client, ticket_details, branch, ritm)
+        elif cat_item == "application":
+            await implement_application_service(client, ticket_details, branch)
+        else:
+            logger.warning(f"Unknown cat_item: {cat_item}, skipping implementation")
 
     return {
         "status": "processed",
@@ -0,0 +1,93 @@
+"""
+Priority classes for webhook events.
+
+Every event is assigned a class from its event type, kind and branch, and each
+class maps to its own work queue (with its own concurrency limit), so a bulk
+artifact regeneration cannot delay an urgent ticket or production deploy.
+Handler runs dispatched to those queues carry their class as a tag, so they can
+record their queue wait and handling time by class.
+"""
+import functools
+import os
+import time
+from enum import Enum
+from typing import Any, Awaitable, Callable
+
+from flows.models import WebhookPayload
+from tasks.metrics import DISPATCH_WAIT_SECONDS, EVENT_SECONDS
+
+ARTIFACT_EVENTS = {"infrahub.artifact.created", "infrahub.artifact.updated"}
+
+PRIORITY_TAG_PREFIX = "priority:"
+
+
+class PriorityClass(str, Enum):
+    urgent = "urgent"
+    standard = "standard"
+    bulk = "bulk"
+
+
+def production_branches() -> set[str]:
+    return {b.strip() for b in os.getenv("PRODUCTION_BRANCHES", "main").split(",") if b.strip()}
+
+
+def classify_event(payload: WebhookPayload) -> PriorityClass:
+    """
+    - urgent: new tickets and artifact changes on a production branch
+    - standard: tickets and artifact changes on other branches
+    - bulk: regenerated artifacts whose content did not change, and everything else
+    """
+    production = payload.branch in production_branches()
+    if payload.is_ticket_created():
+        return PriorityClass.urgent if production else PriorityClass.standard
+    if payload.event in ARTIFACT_EVENTS:
+        if payload.data.checksum and payload.data.checksum == payload.data.checksum_previous:
+            return PriorityClass.bulk
+        return PriorityClass.urgent if production else PriorityClass.standard
+    return PriorityClass.bulk
+
+
+def work_queue_for(priority: PriorityClass) -> str:
+    """Work queue serving a priority class, overridable with WORK_QUEUE_<CLASS>."""
+    return os.getenv(f"WORK_QUEUE_{priority.name.upper()}", priority.value)
+
+
+def priority_tag(priority: PriorityClass) -> str:
+    """Tag marking a dispatched handler run with its priority class."""
+    return f"{PRIORITY_TAG_PREFIX}{priority.value}"
+
+
+def dispatched_priority() -> PriorityClass | None:
+    """Priority class of the current flow run, if webhook_handler dispatched it to a work queue."""
+    from prefect.runtime import flow_run
+
+    for tag in flow_run.tags or []:
+        if tag.startswith(PRIORITY_TAG_PREFIX):
+            try:
+                return PriorityClass(tag[len(PRIORITY_TAG_PREFIX):])
+            except ValueError:
+                return None
+    return None
+
+
+def timed_by_priority(fn: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """
+    Decorate a handler flow function (under @flow) so that, in a run dispatched
+    by webhook_handler, it records how long the run waited on its work queue and
+    how long it took to handle, by priority class. A no-op for other runs.
+    """
+
+    @functools.wraps(fn)
+    async def run(*args: Any, **kwargs: Any) -> Any:
+        priority = dispatched_priority()
+        if priority is None:
+            return await fn(*args, **kwargs)
+        from prefect.runtime import flow_run
+
+        scheduled = flow_run.scheduled_start_time
+        if scheduled is not None:
+            DISPATCH_WAIT_SECONDS.labels(priority.value).observe(max(0.0, time.time() - scheduled.timestamp()))
+        with EVENT_SECONDS.labels(priority.value).time():
+            return await fn(*args, **kwargs)
+
+    return run
@@ -0,0 +1,26 @@
+"""
+Flow to restore the last known good AS3 declaration of an application.
+
+Re-posts the declaration recorded after the last successful deploy (see
+tasks.declaration_store) to every cluster the application was deployed to,
+without regenerating or re-fetching the previous artifact.
+"""
+import asyncio
+
+from prefect import flow, get_run_logger
+
+from flows.deploy_as3_application import rollback_to_last_known_good
+
+
+@flow(name="rollback-as3-application")
+async def rollback_as3_application(target_id: str) -> list[dict]:
+    logger = get_run_logger()
+    logger.info(f"Rolling back AS3 application {target_id} to its last known good declaration")
+    rolled_back = await rollback_to_last_known_good(target_id)
+    if not rolled_back:
+        raise ValueError(f"No last known good declaration recorded for {target_id}")
+    return rolled_back
+
+
+if __name__ == "__main__":
+    asyncio.run(rollback_as3_application("189f7448-6ae6-b797-efe0-c51a44bc4ca9"))
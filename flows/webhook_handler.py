@@ -4,25 +4,126 @@ Webhook handler flow that receives events from Infrahub via the webhook-trigger-
 This flow serves as the entry point for all webhook events and routes them
 to appropriate handlers based on the event type.
 """
+import importlib
 import json
+import os
 from typing import Any
 
 from pydantic import ValidationError
 from prefect import flow, get_run_logger
+from prefect.deployments import run_deployment
 
 from flows.models import WebhookPayload
-from flows.handle_ticket_created import handle_ticket_created
-from flows.deploy_as3_application import deploy_as3_application
+from flows.priority import ARTIFACT_EVENTS, PriorityClass, classify_event, priority_tag, work_queue_for
+from tasks.journal import get_journal
+from tasks.metrics import EVENT_SECONDS, stage
 
-ARTIFACT_EVENTS = {"infrahub.artifact.created", "infrahub.artifact.updated"}
+# Handler flows are imported on first use, so an event only pays for the
+# dependencies of the route it takes (infrahub_sdk, requests, ...).
+ROUTE_MODULES = {
+    "handle_ticket_created": "flows.handle_ticket_created",
+    "deploy_as3_application": "flows.deploy_as3_application",
+}
+
+# Deployments used when WEBHOOK_DISPATCH=deployment, see prefect.yaml.
+ROUTE_DEPLOYMENTS = {
+    "handle_ticket_created": ("handle-ticket-created/handle-ticket-created", "payload"),
+    "deploy_as3_application": ("deploy-as3-application/deploy-as3-application", "webhook_data"),
+}
+
+FLOW_NAME = "webhook-handler"
+
+
+def load_route(route: str):
+    """Import and return the handler flow for a route."""
+    return getattr(importlib.import_module(ROUTE_MODULES[route]), route)
+
+
+def warm_up() -> None:
+    """Import every handler flow up front, for long-lived processes."""
+    for route in ROUTE_MODULES:
+        load_route(route)
+
+
+def select_route(payload: WebhookPayload) -> str | None:
+    """Name of the flow that handles this event, or None if it is not handled."""
+    if payload.is_ticket_created():
+        return "handle_ticket_created"
+    if payload.event in ARTIFACT_EVENTS and (payload.data.target_kind or "").endswith("Application"):
+        return "deploy_as3_application"
+    return None
+
+
+async def dispatch_webhook(route: str, webhook_payload: dict[str, Any], priority: PriorityClass) -> dict[str, Any]:
+    """
+    Start the route's deployment on the work queue of priority without waiting for it.
+    The run is tagged with its class, and times itself (see flows.priority.timed_by_priority).
+    """
+    deployment, parameter = ROUTE_DEPLOYMENTS[route]
+    work_queue_name = work_queue_for(priority)
+    flow_run = await run_deployment(
+        deployment,
+        parameters={parameter: webhook_payload},
+        work_queue_name=work_queue_name,
+        tags=[priority_tag(priority)],
+        timeout=0,
+    )
+    return {"status": "dispatched", "route": route, "work_queue": work_queue_name, "flow_run_id": str(flow_run.id)}
+
+
+async def route_webhook(payload: WebhookPayload, webhook_payload: dict[str, Any]) -> dict[str, Any]:
+    """
+    Route a validated payload to its handler flow.
+
+    Handlers run as subflows, or with WEBHOOK_DISPATCH=deployment as separate
+    deployment runs on the work queue of the event's priority class.
+    """
+    logger = get_run_logger()
+    route = select_route(payload)
+    priority = classify_event(payload)
+
+    if route and os.getenv("WEBHOOK_DISPATCH", "inline") == "deployment":
+        logger.info(f"Dispatching {route} ({priority.value}) to work queue {work_queue_for(priority)}")
+        return await dispatch_webhook(route, webhook_payload, priority)
+
+    # Route to specific handlers based on event type and kind
+    if route == "handle_ticket_created":
+        logger.info(f"Routing to handle_ticket_created: {payload.ritm} ({priority.value})")
+        handle_ticket_created = load_route(route)
+        with EVENT_SECONDS.labels(priority.value).time():
+            result = await handle_ticket_created(payload)
+        return result
+
+    elif route == "deploy_as3_application":
+        logger.info(f"Routing to deploy_as3_application: {payload.event} for {payload.data.target_kind} ({priority.value})")
+        deploy_as3_application = load_route(route)
+        with EVENT_SECONDS.labels(priority.value).time():
+            await deploy_as3_application(webhook_payload)
+        return {
+            "status": "handled",
+            "event": payload.event,
+            "kind": payload.data.target_kind,
+            "branch": payload.branch,
+            "handled": True,
+        }
+
+    logger.info(f"No handler for event: {payload.event} kind: {payload.data.kind or payload.data.target_kind}")
+    return {
+        "status": "received",
+        "event": payload.event,
+        "kind": payload.data.kind or payload.data.target_kind,
+        "branch": payload.branch,
+        "handled": False,
+    }
 
 
 @flow(name="webhook-handler")
-async def webhook_handler(webhook_payload: dict[str, Any]) -> dict[str, Any]:
+async def webhook_handler(webhook_payload: dict[str, Any], journaled: bool = False) -> dict[str, Any]:
     """
     Main webhook handler that receives all Infrahub events.
 
     Validates the payload using Pydantic models and routes to appropriate handlers.
+    journaled is set by the ingest service, which journals events on receipt.
     """
     logger = get_run_logger()
 
@@ -34,7 +135,8 @@ async def webhook_handler(webhook_payload: dict[str, Any]) -> dict[str, Any]:
 
     # Parse and validate payload
     try:
-        payload = WebhookPayload.model_validate(webhook_payload)
+        with stage(FLOW_NAME, "validate"):
+            payload = WebhookPayload.model_validate(webhook_payload)
     except ValidationError as e:
         logger.error(f"Invalid webhook payload: {e}")
         return {"status": "error", "message": "Invalid payload", "errors": e.errors()}
@@ -44,31 +146,13 @@ async def webhook_handler(webhook_payload: dict[str, Any]) -> dict[str, Any]:
         f"Action: {payload.data.action} | Branch: {payload.branch}"
     )
 
-    # Route to specific handlers based on event type and kind
-    if payload.is_ticket_created():
-        logger.info(f"Routing to handle_ticket_created: {payload.ritm}")
-        result = await handle_ticket_created(payload)
-        return result
-
-    elif payload.event in ARTIFACT_EVENTS and (payload.data.target_kind or "").endswith("Application"):
-        logger.info(f"Routing to deploy_as3_application: {payload.event} for {payload.data.target_kind}")
-        await deploy_as3_application(webhook_payload)
-        return {
-            "status": "handled",
-            "event": payload.event,
-            "kind": payload.data.target_kind,
-            "branch": payload.branch,
-            "handled": True,
-        }
+    journal = None if journaled else get_journal()
+    if journal is not None:
+        with stage(FLOW_NAME, "journal"):
+            journal.append(payload)
 
-    logger.info(f"No handler for event: {payload.event} kind: {payload.data.kind or payload.data.target_kind}")
-    return {
-        "status": "received",
-        "event": payload.event,
-        "kind": payload.data.kind or payload.data.target_kind,
-        "branch": payload.branch,
-        "handled": False,
-    }
+    with stage(FLOW_NAME, "route"):
+        return await route_webhook(payload, webhook_payload)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,220 @@
+"""
+Local ingest service for Infrahub webhooks.
+
+Accepts webhook deliveries over HTTP, validates them with WebhookPayload and
+hands them to a bounded queue served by a pool of in-process workers that run
+the webhook handler. Each priority class (see flows.priority) has its own queue
+and workers, so a burst of bulk events cannot starve urgent ones. When a class's
+queue is full the service answers 429 with a Retry-After header so Infrahub
+backs off instead of piling up unbounded work. Accepted events are appended to
+the event journal (when WEBHOOK_JOURNAL_DIR is set) before the 202 is returned,
+so events still queued at a crash or drain timeout can be replayed.
+
+Run with:
+    uvicorn services.ingest:app --host 0.0.0.0 --port 8000
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable
+
+from fastapi import Body, FastAPI
+from fastapi.responses import JSONResponse, Response
+from pydantic import ValidationError
+
+from flows.models import WebhookPayload
+from flows.priority import PriorityClass, classify_event
+from tasks.journal import get_journal
+from tasks.metrics import INGEST_QUEUE_DEPTH, INGEST_REJECTED, INGEST_WAIT_SECONDS, render_metrics
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict[str, Any]], Awaitable[Any]]
+
+DEFAULT_WORKERS = {PriorityClass.urgent: 4, PriorityClass.standard: 4, PriorityClass.bulk: 2}
+
+
+async def run_webhook_handler(webhook_payload: dict[str, Any]) -> Any:
+    """Run the webhook handler flow in-process for an event the ingest service already journaled."""
+    from flows.webhook_handler import webhook_handler
+
+    return await webhook_handler(webhook_payload, journaled=True)
+
+
+class IngestQueue:
+    """Bounded queue of webhook payloads drained by a fixed pool of workers."""
+
+    def __init__(
+        self,
+        handler: Handler = run_webhook_handler,
+        maxsize: int = 1000,
+        workers: int = 8,
+        name: str = "default",
+    ):
+        self.handler = handler
+        self.maxsize = maxsize
+        self.workers = workers
+        self.name = name
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self._reserved = 0
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        # Set on every put and get rather than with set_function(), which multiprocess mode ignores
+        INGEST_QUEUE_DEPTH.labels(name).set(0)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def reserve(self) -> bool:
+        """Claim a slot for a payload submitted later. Returns False when the queue is saturated."""
+        if self.depth + self._reserved >= self.maxsize:
+            self.rejected += 1
+            INGEST_REJECTED.labels(self.name).inc()
+            return False
+        self._reserved += 1
+        return True
+
+    def release(self) -> None:
+        """Give back a slot claimed with reserve() that will not be used."""
+        self._reserved -= 1
+
+    def submit(self, webhook_payload: dict[str, Any], reserved: bool = False) -> bool:
+        """
+        Enqueue a payload without waiting. Returns False when the queue is saturated.
+        With reserved=True it takes the slot claimed by an earlier reserve() and cannot fail.
+        """
+        if not reserved and not self.reserve():
+            return False
+        self._reserved -= 1
+        self._queue.put_nowait((time.perf_counter(), webhook_payload))
+        INGEST_QUEUE_DEPTH.labels(self.name).set(self.depth)
+        self.accepted += 1
+        return True
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Ingest queue {self.name} started (maxsize={self.maxsize}, workers={self.workers})")
+
+    async def stop(self, drain_timeout: float = 30.0) -> None:
+        """Give in-flight work a chance to finish, then cancel the workers."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Ingest queue {self.name} not drained after {drain_timeout}s, {self.depth} events dropped")
+        for worker in self._tasks:
+            worker.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            enqueued_at, webhook_payload = await self._queue.get()
+            INGEST_QUEUE_DEPTH.labels(self.name).set(self.depth)
+            INGEST_WAIT_SECONDS.labels(self.name).observe(time.perf_counter() - enqueued_at)
+            try:
+                await self.handler(webhook_payload)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception(f"Ingest worker {self.name}/{index} failed to handle event {webhook_payload.get('id')}")
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "depth": self.depth,
+            "maxsize": self.maxsize,
+            "workers": self.workers,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+
+def create_app(
+    handler: Handler = run_webhook_handler,
+    maxsize: int | None = None,
+    workers: dict[PriorityClass, int] | None = None,
+    retry_after: int | None = None,
+) -> FastAPI:
+    """
+    Build the ingest application. Unset options are read from the environment:
+    INGEST_QUEUE_SIZE (per class) and INGEST_WORKERS_<CLASS>.
+    """
+    maxsize = maxsize or int(os.getenv("INGEST_QUEUE_SIZE", "1000"))
+    workers = workers or {}
+    queues = {
+        priority: IngestQueue(
+            handler=handler,
+            maxsize=maxsize,
+            workers=workers.get(priority)
+            or int(os.getenv(f"INGEST_WORKERS_{priority.name.upper()}", str(DEFAULT_WORKERS[priority]))),
+            name=priority.value,
+        )
+        for priority in PriorityClass
+    }
+    retry_after = retry_after or int(os.getenv("INGEST_RETRY_AFTER", "1"))
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        for queue in queues.values():
+            await queue.start()
+        yield
+        drain_timeout = float(os.getenv("INGEST_DRAIN_TIMEOUT", "30"))
+        await asyncio.gather(*(queue.stop(drain_timeout=drain_timeout) for queue in queues.values()))
+
+    app = FastAPI(title="netauto-ingest", lifespan=lifespan)
+    app.state.queues = queues
+
+    @app.post("/webhook", status_code=202)
+    async def receive_webhook(webhook_payload: dict[str, Any] = Body(...)):
+        try:
+            payload = WebhookPayload.model_validate(webhook_payload)
+        except ValidationError as e:
+            return JSONResponse(
+                status_code=422,
+                content={"status": "error", "message": "Invalid payload", "errors": json.loads(e.json(include_url=False))},
+            )
+
+        priority = classify_event(payload)
+        queue = queues[priority]
+        if not queue.reserve():
+            return JSONResponse(
+                status_code=429,
+                content={"status": "busy", "id": payload.id, "priority": priority.value},
+                headers={"Retry-After": str(retry_after)},
+            )
+        # Journal before answering 202, so an accepted event survives a crash while still queued. The slot is
+        # reserved first: other requests filling the queue during the append cannot turn it into a 429.
+        journal = get_journal()
+        try:
+            if journal is not None:
+                await asyncio.to_thread(journal.append, payload)
+        except BaseException:
+            queue.release()
+            raise
+        queue.submit(webhook_payload, reserved=True)
+        return {"status": "queued", "id": payload.id, "event": payload.event, "priority": priority.value}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "queues": {priority.value: queue.stats() for priority, queue in queues.items()}}
+
+    @app.get("/metrics")
+    async def metrics():
+        body, content_type = render_metrics()
+        return Response(content=body, media_type=content_type)
+
+    return app
+
+
+app = create_app()
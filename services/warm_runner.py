@@ -0,0 +1,53 @@
+"""
+Long-lived warm runner for webhook events.
+
+Keeps one interpreter resident between events: every handler flow is imported
+up front, a single Infrahub client (with its schema cache) is reused, and events
+run in-process through the ingest service instead of paying a process start and
+cold imports per Prefect deployment run.
+
+Run with:
+    python -m services.warm_runner --host 0.0.0.0 --port 8000
+"""
+import argparse
+import logging
+import os
+import time
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up() -> None:
+    """Load the handler flows and shared clients before the first event arrives."""
+    from flows.webhook_handler import warm_up as load_routes
+    from tasks.metrics import start_metrics_server
+
+    start = time.perf_counter()
+    load_routes()
+    if os.getenv("INFRAHUB_API_URL"):
+        from blocks.blocks import get_infrahub_client
+
+        get_infrahub_client()
+    start_metrics_server()
+    logger.info(f"Warm runner ready in {time.perf_counter() - start:.2f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    os.environ.setdefault("INFRAHUB_CLIENT_REUSE", "true")
+    warm_up()
+
+    from services.ingest import create_app
+
+    uvicorn.run(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Streaming preparation of AS3 declarations.
+
+The rendered artifact is streamed from the Infrahub object store in chunks,
+placeholders are substituted on the fly and the result is kept only in gzip
+form. A deploy then holds one compressed copy of the declaration instead of the
+raw string, the parsed dict, the templated copy and the serialized request body.
+"""
+import gzip
+import io
+import json
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, BinaryIO
+
+import httpx
+from infrahub_sdk import InfrahubClient
+from prefect import get_run_logger
+from prefect.cache_policies import NONE
+
+from tasks.backends import infrahub_backend
+from tasks.execution import hot_task
+from tasks.metrics import external_call
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _SizedReader(io.RawIOBase):
+    """Readable stream with a known length, so requests sends Content-Length instead of chunking."""
+
+    def __init__(self, stream: BinaryIO, size: int):
+        self._stream = stream
+        self._size = size
+        self._position = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        # requests subtracts this from the length; the default tell() raises and makes it chunk the body
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self._position += len(data)
+        return data
+
+
+class PreparedDeclaration:
+    """A rendered AS3 declaration held gzip-compressed, with its uncompressed size."""
+
+    def __init__(self, compressed: bytes, size: int):
+        self.compressed = compressed
+        self.size = size
+
+    @classmethod
+    def from_dict(cls, declaration: dict[str, Any]) -> "PreparedDeclaration":
+        raw = json.dumps(declaration).encode()
+        return cls(gzip.compress(raw), len(raw))
+
+    @classmethod
+    def from_file(cls, path: str, size: int) -> "PreparedDeclaration":
+        with open(path, "rb") as f:
+            return cls(f.read(), size)
+
+    def write(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(self.compressed)
+
+    def body(self) -> _SizedReader:
+        """Uncompressed request body, decompressed while it is being sent."""
+        return _SizedReader(gzip.GzipFile(fileobj=io.BytesIO(self.compressed), mode="rb"), self.size)
+
+    def load(self) -> dict[str, Any]:
+        """Parse the declaration. Only for callers that need the structure."""
+        with gzip.GzipFile(fileobj=io.BytesIO(self.compressed), mode="rb") as f:
+            return json.load(f)
+
+
+class _Substitute:
+    """Replace placeholders in a byte stream, including ones split across chunks."""
+
+    def __init__(self, replacements: dict[str, str]):
+        self._replacements = [(old.encode(), new.encode()) for old, new in replacements.items()]
+        self._keep = max((len(old) for old, _ in self._replacements), default=1) - 1
+        self._pending = b""
+
+    def feed(self, chunk: bytes) -> bytes:
+        data = self._pending + chunk
+        for old, new in self._replacements:
+            data = data.replace(old, new)
+        if self._keep and len(data) > self._keep:
+            data, self._pending = data[: -self._keep], data[-self._keep :]
+        elif self._keep:
+            data, self._pending = b"", data
+        return data
+
+    def flush(self) -> bytes:
+        data, self._pending = self._pending, b""
+        return data
+
+
+async def _expired_login(response: httpx.Response) -> bool:
+    if response.status_code != 401:
+        return False
+    await response.aread()
+    try:
+        errors = response.json().get("errors", [])
+    except ValueError:
+        return False
+    return "Expired Signature" in [error.get("message") for error in errors]
+
+
+@asynccontextmanager
+async def _stream_object(infrahub_client: InfrahubClient, storage_id: str) -> AsyncIterator[httpx.Response]:
+    """
+    Streams an object store object through the client's own streaming GET, so it
+    uses the client's proxy, TLS, timeout and retry settings and logs in first.
+    An expired token is refreshed once, as the SDK does for its other requests.
+    """
+    if not hasattr(infrahub_client, "_get_streaming"):
+        raise RuntimeError("Streaming artifacts needs infrahub-sdk >= 1.19 (InfrahubClient._get_streaming)")
+    url = f"{infrahub_client.address}/api/storage/object/{storage_id}"
+    for relogin in (True, False):
+        async with infrahub_client._get_streaming(url=url) as response:
+            if not (relogin and await _expired_login(response)):
+                response.raise_for_status()
+                yield response
+                return
+        await infrahub_client.login(refresh=True)
+
+
+# Never cached: the result is the whole declaration, and the flow caches the deploy itself
+@hot_task(cache_policy=NONE)
+async def fetch_rendered_artifact(
+    infrahub_client: InfrahubClient, storage_id: str, replacements: dict[str, str] | None = None
+) -> PreparedDeclaration:
+    """
+    Streams an artifact from the Infrahub object store, substituting
+    replacements on the way, into a gzip-compressed PreparedDeclaration.
+    """
+    logger = get_run_logger()
+    logger.info(f"Streaming artifact with storage_id: {storage_id}")
+    substitute = _Substitute(replacements or {})
+    buffer = io.BytesIO()
+    size = 0
+
+    async with infrahub_backend().guard():
+        with external_call("infrahub", "object_store_get"):
+            async with _stream_object(infrahub_client, storage_id) as response:
+                with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=6) as compressed:
+                    async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                        data = substitute.feed(chunk)
+                        compressed.write(data)
+                        size += len(data)
+                    data = substitute.flush()
+                    compressed.write(data)
+                    size += len(data)
+
+    if not size:
+        raise ValueError(f"No payload found for storage_id {storage_id}")
+    logger.info(f"Artifact {storage_id}: {size} bytes, {buffer.tell()} compressed")
+    return PreparedDeclaration(buffer.getvalue(), size)
@@ -0,0 +1,241 @@
+"""
+Isolation for external backends: a bounded executor and a circuit breaker per backend.
+
+Every F5 cluster gets its own thread pool ("f5:<cluster>") and Infrahub gets a
+concurrency limit ("infrahub"), so one hung device can only exhaust its own
+pool instead of the shared default executor. After repeated failures or
+timeouts a backend's breaker opens and calls fail fast with CircuitOpenError;
+after a cool-down one probe call is let through to test recovery. Only errors
+that say the backend is unhealthy count: for Infrahub those are transport
+errors, timeouts and 5xx answers, not a missing node or a rejected query.
+
+Breaker state, in-flight calls and rejections are exported as metrics.
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import Any, AsyncIterator, Callable
+
+import httpx
+from infrahub_sdk.exceptions import JsonDecodeError, ServerNotReachableError, ServerNotResponsiveError
+
+from tasks.metrics import BACKEND_CAPACITY, BACKEND_CIRCUIT_STATE, BACKEND_IN_FLIGHT, BACKEND_REJECTED
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend whose circuit breaker is open."""
+
+
+class RequestRejected(Exception):
+    """
+    The backend answered but refused the request (for example an invalid
+    declaration). The backend itself is healthy, so this does not count
+    against its breaker.
+    """
+
+
+def is_backend_failure(exc: BaseException) -> bool:
+    """Default breaker accounting: every error but a RequestRejected counts against the backend."""
+    return not isinstance(exc, RequestRejected)
+
+
+def is_infrahub_failure(exc: BaseException) -> bool:
+    """
+    Only transport errors, timeouts and 5xx answers count against Infrahub. SDK
+    errors such as NodeNotFoundError or GraphQLError come from a healthy server,
+    like AS3DeclarationRejected from a device.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    # A JsonDecodeError is the SDK reading an error page, typically from a failing proxy or server
+    return isinstance(
+        exc, (ServerNotReachableError, ServerNotResponsiveError, JsonDecodeError, httpx.TransportError, TimeoutError)
+    )
+
+
+class CircuitState(int, Enum):
+    closed = 0
+    half_open = 1
+    open = 2
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures, probes again after reset_timeout seconds."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitState.closed
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        BACKEND_CIRCUIT_STATE.labels(name).set(self.state.value)
+
+    def _set_state(self, state: CircuitState) -> None:
+        self.state = state
+        BACKEND_CIRCUIT_STATE.labels(self.name).set(state.value)
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now. In half-open state only one probe at a time is allowed."""
+        with self._lock:
+            if self.state == CircuitState.open and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._set_state(CircuitState.half_open)
+            if self.state == CircuitState.closed:
+                return True
+            if self.state == CircuitState.half_open and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._set_state(CircuitState.closed)
+
+    def record_cancelled(self) -> None:
+        """The call was cancelled by its caller: says nothing about the backend, only frees the probe slot."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == CircuitState.half_open or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(CircuitState.open)
+
+
+class Backend:
+    """A named external backend with its own concurrency limit, call timeout and circuit breaker."""
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        timeout: float,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        is_failure: Callable[[BaseException], bool] = is_backend_failure,
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.is_failure = is_failure
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+        self._limits: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = weakref.WeakKeyDictionary()
+        BACKEND_CAPACITY.labels(name).set(max_workers)
+
+    def _check(self) -> None:
+        if not self.breaker.allow():
+            BACKEND_REJECTED.labels(self.name).inc()
+            raise CircuitOpenError(f"Circuit breaker for {self.name} is open, not calling it")
+
+    def _record(self, exc: Exception) -> None:
+        if self.is_failure(exc):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _track(self, delta: int) -> None:
+        # Also called from worker threads, when a call finishes after its caller gave up on it
+        with self._in_flight_lock:
+            self.in_flight += delta
+            BACKEND_IN_FLIGHT.labels(self.name).set(self.in_flight)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run a blocking call on this backend's own thread pool, bounded by the call timeout.
+        A call that times out keeps its thread, and counts as in flight, until it returns.
+        """
+        self._check()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"backend-{self.name}")
+        self._track(1)
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self._track(-1))
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.CancelledError:
+            self.breaker.record_cancelled()
+            raise
+        except Exception as exc:
+            self._record(exc)
+            raise
+        self.breaker.record_success()
+        return result
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        """Guard a block of async calls: concurrency limit, timeout and breaker accounting."""
+        self._check()
+        loop = asyncio.get_running_loop()
+        if loop not in self._limits:
+            self._limits[loop] = asyncio.Semaphore(self.max_workers)
+        async with self._limits[loop]:
+            self._track(1)
+            try:
+                async with asyncio.timeout(self.timeout):
+                    yield
+            except asyncio.CancelledError:
+                self.breaker.record_cancelled()
+                raise
+            except Exception as exc:
+                self._record(exc)
+                raise
+            finally:
+                self._track(-1)
+        self.breaker.record_success()
+
+
+_backends: dict[str, Backend] = {}
+_backends_lock = threading.Lock()
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def get_backend(name: str) -> Backend:
+    """
+    The process-wide Backend for name. F5 backends ("f5:<cluster>") are sized by
+    AS3_CLUSTER_CONCURRENCY and F5_BACKEND_TIMEOUT, Infrahub by INFRAHUB_CONCURRENCY
+    and INFRAHUB_BACKEND_TIMEOUT. Breakers use BREAKER_FAILURE_THRESHOLD and
+    BREAKER_RESET_TIMEOUT.
+    """
+    with _backends_lock:
+        if name not in _backends:
+            if name.startswith("f5:"):
+                max_workers = _env_int("AS3_CLUSTER_CONCURRENCY", 2)
+                timeout = float(os.getenv("F5_BACKEND_TIMEOUT", "180"))
+            else:
+                max_workers = _env_int("INFRAHUB_CONCURRENCY", 16)
+                timeout = float(os.getenv("INFRAHUB_BACKEND_TIMEOUT", "60"))
+            _backends[name] = Backend(
+                name,
+                max_workers=max_workers,
+                timeout=timeout,
+                failure_threshold=_env_int("BREAKER_FAILURE_THRESHOLD", 5),
+                reset_timeout=float(os.getenv("BREAKER_RESET_TIMEOUT", "30")),
+                is_failure=is_infrahub_failure if name == "infrahub" else is_backend_failure,
+            )
+        return _backends[name]
+
+
+def f5_backend(cluster: str) -> Backend:
+    return get_backend(f"f5:{cluster}")
+
+
+def infrahub_backend() -> Backend:
+    return get_backend("infrahub")
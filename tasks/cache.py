@@ -0,0 +1,104 @@
+"""
+Cache policies for idempotent deploy and ticket tasks.
+
+Results are keyed on the inputs that identify the work (for example target_id
+and checksum for a deploy) rather than on every argument, so a Prefect retry or
+a duplicate webhook delivery returns the stored result instead of repeating the
+external calls. Deploy keys also include the device's generation in the
+declaration store, so a deploy is only reused while it is the latest one.
+Records are kept in a local directory (NETAUTO_CACHE_DIR) and expire after a
+per-policy TTL.
+"""
+import os
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+from typing import Any
+
+from prefect import Task
+from prefect.cache_policies import CachePolicy
+from prefect.context import TaskRunContext
+from prefect.results import get_result_store
+from prefect.utilities.hashing import hash_objects
+
+from flows.models import WebhookPayload
+from tasks.declaration_store import DeclarationStore
+
+CACHE_DIR = Path(os.getenv("NETAUTO_CACHE_DIR", "~/.prefect/netauto-cache")).expanduser()
+
+DEPLOY_CACHE_TTL = timedelta(seconds=int(os.getenv("DEPLOY_CACHE_TTL", "3600")))
+TICKET_CACHE_TTL = timedelta(seconds=int(os.getenv("TICKET_CACHE_TTL", "86400")))
+
+
+def deploy_key(task_key: str, target_id: str, checksum: str, address: str) -> str:
+    """Cache key of a post of checksum to the device at address, at the device's current generation."""
+    generation = DeclarationStore().generation(target_id, address, checksum)
+    return hash_objects(task_key, target_id, checksum, address, generation)
+
+
+@dataclass
+class DeployKey(CachePolicy):
+    """
+    Key a post to one device on (target_id, checksum, address) and the device's
+    generation in the declaration store. A retry or duplicate of the latest deploy
+    to the device hits. Deploying an earlier checksum again after the device moved
+    on, or after it diverged from its record, does not.
+    """
+
+    target: str = "target_id"
+    checksum: str = "checksum"
+    address: str = "cluster_ip"
+
+    def compute_key(
+        self,
+        task_ctx: TaskRunContext,
+        inputs: dict[str, Any],
+        flow_parameters: dict[str, Any],
+        **kwargs: Any,
+    ) -> str | None:
+        target_id, checksum, address = (inputs.get(name) for name in (self.target, self.checksum, self.address))
+        if target_id is None or checksum is None or address is None:
+            return None
+        return deploy_key(task_ctx.task.task_key, target_id, checksum, address)
+
+
+@dataclass
+class TicketKey(CachePolicy):
+    """Key a task on the (ritm, cat_item) of the ticket the flow run is handling."""
+
+    def compute_key(
+        self,
+        task_ctx: TaskRunContext,
+        inputs: dict[str, Any],
+        flow_parameters: dict[str, Any],
+        **kwargs: Any,
+    ) -> str | None:
+        payload = flow_parameters.get("payload")
+        if isinstance(payload, dict):
+            payload = WebhookPayload.model_validate(payload)
+        if payload is None or not payload.ritm:
+            return None
+        return hash_objects(task_ctx.task.task_key, payload.ritm, payload.cat_item)
+
+
+def _local(policy: CachePolicy) -> CachePolicy:
+    return policy.configure(key_storage=CACHE_DIR)
+
+
+def keyed_on_deploy() -> CachePolicy:
+    """DeployKey policy, stored in the local cache directory."""
+    return _local(DeployKey())
+
+
+async def deploy_cached(task: Task, target_id: str, checksum: str, address: str) -> bool:
+    """
+    Whether a run of task, cached with keyed_on_deploy(), would be served from the
+    cache for this post, so a caller can skip preparing its inputs.
+    """
+    store = await get_result_store().aupdate_for_task(task)
+    return await store.aexists(deploy_key(task.task_key, target_id, checksum, address))
+
+
+def keyed_on_ticket() -> CachePolicy:
+    """TicketKey policy, stored in the local cache directory."""
+    return _local(TicketKey())
@@ -1,9 +1,12 @@
 from pydantic import BaseModel
-from prefect import task, get_run_logger
+from prefect import get_run_logger
 from infrahub_sdk import InfrahubClient
 from enum import Enum
 # from f5_as3_sdk.connector import AS3Applications
-import os, json
+import os
+from tasks.metrics import external_call
+from tasks.execution import hot_task
+from tasks.backends import infrahub_backend
 
 class DeploymentStatus(str, Enum):
     failed = "failed"
@@ -31,7 +34,7 @@ class WebhookPayload(BaseModel):
     occured_at: str
     event: str
 
-@task()
+@hot_task
 def validate_webhook_data(webhook_data: dict) -> WebhookPayload:
     """
     Validates the incoming webhook data against the WebhookPayload model.
@@ -72,24 +75,7 @@ def get_as3_client(address: str = None, username: str = None, password: str = No
 #     logger.info(client.get_version())
 #     return client
 
-@task()
-async def fetch_infrahub_artifact(infrahub_client: InfrahubClient, storage_id: str) -> dict:
-    """
-    Fetches an artifact from Infrahub using the provided storage ID.
-    Returns the artifact as a dictionary.
-    """
-    logger = get_run_logger()
-    logger.info(f"Fetching artifact with storage_id: {storage_id}")
-    payload_str = await infrahub_client.object_store.get(identifier=storage_id)
-    if not payload_str:
-        raise ValueError(f"No payload found for storage_id {storage_id}")
-    
-    try:
-        return json.loads(payload_str)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Error parsing payload for storage_id {storage_id}: {e}") from e
-
-@task()
+@hot_task
 async def set_node_deployment_status(infrahub_client: InfrahubClient, target_kind: str, target_id: str, status: DeploymentStatus):
     """
     Sets the status of the target application in Infrahub.
@@ -97,8 +83,11 @@ async def set_node_deployment_status(infrahub_client: InfrahubClient, target_kin
     """
     # status choices are failed crashed deployed running pending unknown
     logger = get_run_logger()
-    node = await infrahub_client.get(kind=target_kind, id=target_id)
-    node.deployment_status.value = status
-    await node.save(allow_upsert=True)
+    async with infrahub_backend().guard():
+        with external_call("infrahub", "get"):
+            node = await infrahub_client.get(kind=target_kind, id=target_id)
+        node.deployment_status.value = status
+        with external_call("infrahub", "save"):
+            await node.save(allow_upsert=True)
     logger.info(f"Status for target node {target_id} set to {status}")
 
@@ -0,0 +1,186 @@
+"""
+Local store of the last successfully applied AS3 declaration per application and device.
+
+Each record lives at <root>/<target_id>/<address>.json and names the device's
+address and its cluster, so a lookup is a single small file read, and is
+replaced atomically after every successful deploy. The
+declaration itself is stored gzip-compressed next to it, in a file named after
+its checksum that the record refers to, so a record never points at a body it
+was not written with. The deploy failure hook uses the store to re-post the
+last known good declaration in one AS3 call instead of regenerating the
+previous artifact. Drift detection compares the per-application digests of
+these declarations with what the devices report.
+
+Each record also carries a generation, which changes whenever the device moves
+to another declaration or is known to have diverged from its record. The deploy
+result cache is scoped to it (see tasks.cache.DeployKey), so only a retry or
+duplicate of the latest deploy to a device is served from the cache.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from tasks.artifacts import PreparedDeclaration
+
+DEFAULT_ROOT = "~/.prefect/netauto-declarations"
+
+
+def _safe(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+def application_digests(declaration: dict[str, Any]) -> dict[str, str]:
+    """
+    sha256 of every Application in a declaration or tenant, over its canonical
+    JSON form (sorted keys, no whitespace), keyed by application name.
+    """
+    return {
+        name: hashlib.sha256(json.dumps(value, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+        for name, value in declaration.items()
+        if isinstance(value, dict) and value.get("class") == "Application"
+    }
+
+
+def _load(path: str) -> dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def _next_generation(record: dict[str, Any] | None, checksum: str) -> int:
+    if record is None:
+        return 0
+    generation = record.get("generation", 0)
+    return generation if record.get("checksum") == checksum else generation + 1
+
+
+def _write_json(path: str, data: dict[str, Any]) -> None:
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class DeclarationStore:
+    def __init__(self, root: str | None = None):
+        self.root = os.path.expanduser(root or os.getenv("AS3_DECLARATION_STORE", DEFAULT_ROOT))
+
+    def _path(self, target_id: str, address: str) -> str:
+        return os.path.join(self.root, _safe(target_id), _safe(address) + ".json")
+
+    @contextmanager
+    def _locked(self, target_id: str) -> Iterator[str]:
+        """Serialise read-modify-write of the records of target_id. Yields their directory."""
+        directory = os.path.join(self.root, _safe(target_id))
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield directory
+
+    def save(
+        self, target_id: str, address: str, cluster: str, tenant: str, checksum: str, declaration: PreparedDeclaration
+    ) -> None:
+        """Record declaration as the last known good one for target_id on the device at address, in cluster."""
+        path = self._path(target_id, address)
+        with self._locked(target_id) as directory:
+            body = f"{_safe(address)}.{_safe(checksum)}.json.gz"
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            os.close(fd)
+            declaration.write(tmp)
+            os.replace(tmp, os.path.join(directory, body))
+
+            previous = self.get(target_id, address)
+            record = {
+                "target_id": target_id,
+                "address": address,
+                "cluster": cluster,
+                "tenant": tenant,
+                "checksum": checksum,
+                "generation": _next_generation(previous, checksum),
+                "applied_at": time.time(),
+                "body": body,
+                "size": declaration.size,
+            }
+            _write_json(path, record)
+            self._prune(directory, address, keep={body, previous.get("body") if previous else None})
+
+    def generation(self, target_id: str, address: str, checksum: str) -> int:
+        """Generation the device at address would have after a successful deploy of checksum."""
+        return _next_generation(self.get(target_id, address), checksum)
+
+    def invalidate(self, target_id: str, address: str) -> None:
+        """
+        Mark the device at address as no longer running its recorded declaration
+        (it took a deploy that was not recorded, or drifted), so that no cached
+        deploy to it is reused.
+        """
+        path = self._path(target_id, address)
+        with self._locked(target_id):
+            record = self.get(target_id, address) or {"target_id": target_id, "address": address}
+            record["generation"] = record.get("generation", 0) + 1
+            _write_json(path, record)
+
+    def _prune(self, directory: str, address: str, keep: set[str | None]) -> None:
+        # Bodies and digests other than the current and the previous ones; a reader may still hold the previous record
+        prefix = _safe(address) + "."
+        keep = {name.removesuffix(".json.gz") for name in keep if name}
+        for name in os.listdir(directory):
+            stem = name.removesuffix(".json.gz").removesuffix(".digests")
+            checksum = stem[len(prefix) :] if stem != name and name.startswith(prefix) else ""
+            if checksum and "." not in checksum and stem not in keep:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def declaration(self, record: dict[str, Any]) -> PreparedDeclaration:
+        """The declaration of a record returned by get() or for_target()."""
+        directory = os.path.dirname(self._path(record["target_id"], record["address"]))
+        return PreparedDeclaration.from_file(os.path.join(directory, record["body"]), record["size"])
+
+    def digests(self, record: dict[str, Any]) -> dict[str, str]:
+        """
+        application_digests() of a record's declaration. Computed once and kept in
+        a sidecar file named after the body, so later drift checks do not parse the
+        declaration again and the record itself is never rewritten.
+        """
+        directory = os.path.dirname(self._path(record["target_id"], record["address"]))
+        path = os.path.join(directory, record["body"].removesuffix(".json.gz") + ".digests")
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            digests = application_digests(self.declaration(record).load())
+            _write_json(path, digests)
+            return digests
+
+    def get(self, target_id: str, address: str) -> dict[str, Any] | None:
+        """Last known good record for target_id on the device at address, or None."""
+        try:
+            return _load(self._path(target_id, address))
+        except FileNotFoundError:
+            return None
+
+    def for_target(self, target_id: str) -> list[dict[str, Any]]:
+        """Last known good records for target_id on every device it was deployed to."""
+        directory = os.path.join(self.root, _safe(target_id))
+        try:
+            names = sorted(n for n in os.listdir(directory) if n.endswith(".json"))
+        except FileNotFoundError:
+            return []
+        records = [_load(os.path.join(directory, name)) for name in names]
+        # Devices that were invalidated before anything was recorded for them have no declaration
+        return [record for record in records if "checksum" in record]
+
+    def records(self) -> list[dict[str, Any]]:
+        """Last known good records of every application on every device."""
+        try:
+            targets = sorted(os.listdir(self.root))
+        except FileNotFoundError:
+            return []
+        return [record for target in targets for record in self.for_target(target)]
@@ -0,0 +1,74 @@
+"""
+Execution mode for small hot-path steps.
+
+Steps decorated with hot_task() are Prefect tasks by default. With
+NETAUTO_TASK_MODE=inline they run as plain in-process functions instead, with
+their duration recorded locally, which avoids a task run (state persistence and
+API calls) per step. Steps that need retries or caching keep using @task.
+
+The mode is read when the step is decorated, i.e. at import time.
+"""
+import functools
+import inspect
+import os
+import time
+from typing import Any, Callable
+
+from prefect import task
+
+from tasks.metrics import INLINE_STEP_SECONDS
+
+TASK_MODE = "task"
+INLINE_MODE = "inline"
+
+
+def execution_mode() -> str:
+    mode = os.getenv("NETAUTO_TASK_MODE", TASK_MODE).lower()
+    if mode not in (TASK_MODE, INLINE_MODE):
+        raise ValueError(f"Invalid NETAUTO_TASK_MODE {mode!r}, expected {TASK_MODE!r} or {INLINE_MODE!r}")
+    return mode
+
+
+def _inline(fn: Callable) -> Callable:
+    histogram = INLINE_STEP_SECONDS.labels(fn.__name__)
+
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def run_async(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+        wrapper = run_async
+    else:
+
+        @functools.wraps(fn)
+        def run_sync(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+        wrapper = run_sync
+
+    # Same attribute as a Prefect task, so callers can reach the undecorated function either way.
+    wrapper.fn = fn
+    return wrapper
+
+
+def hot_task(fn: Callable | None = None, **task_kwargs: Any) -> Callable:
+    """
+    Decorate a hot-path step: a Prefect task, or a plain function in inline mode.
+
+    Usable bare (@hot_task) or with task options (@hot_task(cache_policy=NONE)),
+    which only apply in task mode.
+    """
+    if fn is None:
+        return functools.partial(hot_task, **task_kwargs)
+    if execution_mode() == INLINE_MODE:
+        return _inline(fn)
+    return task(fn, **task_kwargs)
@@ -0,0 +1,169 @@
+"""
+Append-only on-disk journal of validated webhook payloads.
+
+Events are appended to size-rotated segment files, one record per line:
+
+    <journaled_at>\t<event>\t<target>\t<compact JSON payload>\n
+
+Every segment has a companion index of fixed-size (offset, length, journaled_at)
+entries, so replay can jump straight to a time range and slice records out of a
+memory-mapped segment without parsing payloads that the filters reject.
+"""
+import bisect
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Any, Iterable, Iterator
+
+from flows.models import WebhookPayload
+
+try:
+    from orjson import loads as _loads
+except ImportError:  # orjson ships with prefect, but the journal does not require it
+    from json import loads as _loads
+
+INDEX_ENTRY = struct.Struct("<QId")
+LOG_SUFFIX = ".log"
+INDEX_SUFFIX = ".idx"
+
+
+def _segment_name(first_seq: int) -> str:
+    return f"{first_seq:020d}"
+
+
+def _target_of(payload: WebhookPayload) -> str:
+    return payload.data.target_id or payload.data.node_id
+
+
+def _timestamp(value: datetime | float | None) -> float | None:
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return value.timestamp()
+
+
+class _SegmentIndex:
+    """Read-only view of a segment index that bisects on journaled_at."""
+
+    def __init__(self, data: bytes | mmap.mmap):
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._data) // INDEX_ENTRY.size
+
+    def __getitem__(self, i: int) -> float:
+        return INDEX_ENTRY.unpack_from(self._data, i * INDEX_ENTRY.size)[2]
+
+    def entry(self, i: int) -> tuple[int, int, float]:
+        return INDEX_ENTRY.unpack_from(self._data, i * INDEX_ENTRY.size)
+
+
+class EventJournal:
+    """
+    Segment-rotated append-only journal.
+
+    Appends are serialised with a file lock, so several worker processes can
+    share one journal directory.
+    """
+
+    def __init__(self, directory: str, max_segment_bytes: int = 64 * 1024 * 1024, fsync: bool = False):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def segments(self) -> list[str]:
+        """Segment base names in append order."""
+        return sorted(name[: -len(LOG_SUFFIX)] for name in os.listdir(self.directory) if name.endswith(LOG_SUFFIX))
+
+    def _path(self, segment: str, suffix: str) -> str:
+        return os.path.join(self.directory, segment + suffix)
+
+    def append(self, payload: WebhookPayload, journaled_at: float | None = None) -> None:
+        """Append a validated payload to the active segment, rotating it when full."""
+        body = payload.model_dump_json(exclude_none=True)
+
+        with self._lock, open(os.path.join(self.directory, "journal.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Taken under the lock so journaled_at is ordered within a segment.
+            journaled_at = time.time() if journaled_at is None else journaled_at
+            record = f"{journaled_at!r}\t{payload.event}\t{_target_of(payload)}\t{body}\n".encode()
+            segments = self.segments()
+            segment = segments[-1] if segments else _segment_name(0)
+            if segments and os.path.getsize(self._path(segment, LOG_SUFFIX)) >= self.max_segment_bytes:
+                count = os.path.getsize(self._path(segment, INDEX_SUFFIX)) // INDEX_ENTRY.size
+                segment = _segment_name(int(segment) + count)
+
+            with open(self._path(segment, LOG_SUFFIX), "ab") as log, open(self._path(segment, INDEX_SUFFIX), "ab") as index:
+                # Drop a torn index entry left behind by a crash mid-append.
+                index.truncate(index.tell() - index.tell() % INDEX_ENTRY.size)
+                offset = log.tell()
+                log.write(record)
+                log.flush()
+                index.write(INDEX_ENTRY.pack(offset, len(record), journaled_at))
+                index.flush()
+                if self.fsync:
+                    os.fsync(log.fileno())
+                    os.fsync(index.fileno())
+
+    def scan(
+        self,
+        since: datetime | float | None = None,
+        until: datetime | float | None = None,
+        events: Iterable[str] | None = None,
+        targets: Iterable[str] | None = None,
+    ) -> Iterator[tuple[float, dict[str, Any]]]:
+        """
+        Yield (journaled_at, payload dict) for journaled events matching all filters.
+
+        Time bounds apply to the time the event was journaled and are inclusive.
+        """
+        since, until = _timestamp(since), _timestamp(until)
+        events = {e.encode() for e in events} if events else None
+        targets = {t.encode() for t in targets} if targets else None
+
+        for segment in self.segments():
+            with open(self._path(segment, INDEX_SUFFIX), "rb") as index_file:
+                index_bytes = index_file.read()
+            index = _SegmentIndex(index_bytes)
+            if not len(index):
+                continue
+            if (until is not None and index[0] > until) or (since is not None and index[len(index) - 1] < since):
+                continue
+            start = bisect.bisect_left(index, since) if since is not None else 0
+
+            with open(self._path(segment, LOG_SUFFIX), "rb") as log_file:
+                with mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as log:
+                    for i in range(start, len(index)):
+                        offset, length, journaled_at = index.entry(i)
+                        if until is not None and journaled_at > until:
+                            break
+                        record = log[offset : offset + length]
+                        _, event, target, body = record.split(b"\t", 3)
+                        if events is not None and event not in events:
+                            continue
+                        if targets is not None and target not in targets:
+                            continue
+                        yield journaled_at, _loads(body)
+
+
+_journal: EventJournal | None = None
+
+
+def get_journal() -> EventJournal | None:
+    """Process-wide journal configured by WEBHOOK_JOURNAL_DIR, or None when journaling is off."""
+    global _journal
+    directory = os.getenv("WEBHOOK_JOURNAL_DIR")
+    if not directory:
+        return None
+    if _journal is None or _journal.directory != directory:
+        _journal = EventJournal(
+            directory,
+            max_segment_bytes=int(os.getenv("WEBHOOK_JOURNAL_SEGMENT_BYTES", str(64 * 1024 * 1024))),
+            fsync=os.getenv("WEBHOOK_JOURNAL_FSYNC", "false").lower() in ("1", "true", "yes"),
+        )
+    return _journal
@@ -0,0 +1,163 @@
+"""
+Prometheus metrics for the flows and the ingest service.
+
+stage() times a named step of a flow and external_call() times and counts a
+single call to an external backend (Infrahub, F5). Both are cheap enough to
+leave on in production: a few microseconds per observation.
+
+The ingest service exposes the metrics on /metrics. For process-per-run
+workers, set PROMETHEUS_MULTIPROC_DIR so every run writes to a shared directory,
+and run `python -m tasks.metrics` with METRICS_PORT to aggregate and serve it.
+In that mode gauges only report live processes: each process removes its gauge
+files when it exits.
+"""
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+STAGE_SECONDS = Histogram(
+    "netauto_stage_duration_seconds",
+    "Duration of a flow stage",
+    ["flow", "stage"],
+)
+EXTERNAL_CALL_SECONDS = Histogram(
+    "netauto_external_call_duration_seconds",
+    "Duration of a call to an external backend",
+    ["backend", "operation"],
+)
+EXTERNAL_CALLS = Counter(
+    "netauto_external_calls_total",
+    "Calls to external backends",
+    ["backend", "operation", "outcome"],
+)
+EVENT_SECONDS = Histogram(
+    "netauto_event_duration_seconds",
+    "Time to handle a routed webhook event, by priority class",
+    ["priority"],
+)
+DISPATCH_WAIT_SECONDS = Histogram(
+    "netauto_dispatch_wait_seconds",
+    "Time a dispatched handler run waited on its work queue before starting, by priority class",
+    ["priority"],
+)
+INGEST_WAIT_SECONDS = Histogram(
+    "netauto_ingest_wait_seconds",
+    "Time an event waited in the ingest queue before a worker picked it up, by priority class",
+    ["priority"],
+)
+INGEST_QUEUE_DEPTH = Gauge(
+    "netauto_ingest_queue_depth",
+    "Events waiting in the ingest queue, by priority class",
+    ["priority"],
+    multiprocess_mode="livesum",
+)
+INGEST_REJECTED = Counter(
+    "netauto_ingest_rejected_total",
+    "Events rejected with 429 because the queue was full, by priority class",
+    ["priority"],
+)
+BACKEND_CIRCUIT_STATE = Gauge(
+    "netauto_backend_circuit_state",
+    "Circuit breaker state per backend (0 closed, 1 half-open, 2 open)",
+    ["backend"],
+    multiprocess_mode="livemax",
+)
+BACKEND_IN_FLIGHT = Gauge(
+    "netauto_backend_in_flight",
+    "Calls currently running against a backend",
+    ["backend"],
+    multiprocess_mode="livesum",
+)
+BACKEND_CAPACITY = Gauge(
+    "netauto_backend_capacity",
+    "Maximum concurrent calls per backend",
+    ["backend"],
+    multiprocess_mode="livemax",
+)
+BACKEND_REJECTED = Counter(
+    "netauto_backend_rejected_total",
+    "Calls rejected because the backend's circuit breaker was open",
+    ["backend"],
+)
+INLINE_STEP_SECONDS = Histogram(
+    "netauto_inline_step_duration_seconds",
+    "Duration of a hot-path step run inline instead of as a Prefect task",
+    ["step"],
+)
+
+_server_started = False
+
+
+def _mark_process_dead() -> None:
+    # Read at exit, not at import: a forked worker must remove its own files, not its parent's
+    multiprocess.mark_process_dead(os.getpid())
+
+
+if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    atexit.register(_mark_process_dead)
+
+
+@contextmanager
+def stage(flow: str, name: str) -> Iterator[None]:
+    """Time a stage of a flow, whether it succeeds or raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(flow, name).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def external_call(backend: str, operation: str) -> Iterator[None]:
+    """Time and count a call to an external backend, recording whether it raised."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        EXTERNAL_CALL_SECONDS.labels(backend, operation).observe(time.perf_counter() - start)
+        EXTERNAL_CALLS.labels(backend, operation, outcome).inc()
+
+
+def _registry() -> CollectorRegistry:
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Metrics in Prometheus text format, with the matching content type."""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server() -> None:
+    """Serve metrics on METRICS_PORT, once per process. Does nothing when the variable is unset."""
+    global _server_started
+    port = os.getenv("METRICS_PORT")
+    if port and not _server_started:
+        start_http_server(int(port), registry=_registry())
+        _server_started = True
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("METRICS_PORT", "9100")
+    start_metrics_server()
+    threading.Event().wait()
@@ -0,0 +1,92 @@
+"""Tests for streaming placeholder substitution and prepared declarations."""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+import requests
+
+from tasks.artifacts import PreparedDeclaration, _stream_object, _Substitute
+
+
+def substitute(chunks: list[bytes], replacements: dict[str, str]) -> bytes:
+    s = _Substitute(replacements)
+    return b"".join(s.feed(chunk) for chunk in chunks) + s.flush()
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 6, 7, 64])
+def test_placeholder_split_across_chunks(size: int):
+    data = b'{"vs_XXXXXX": {"pool": "pool_XXXXXX"}, "end": "XXXXX"}'
+    chunks = [data[i : i + size] for i in range(0, len(data), size)]
+
+    assert substitute(chunks, {"XXXXXX": "abc123"}) == data.replace(b"XXXXXX", b"abc123")
+
+
+def test_several_placeholders_and_empty_chunks():
+    chunks = [b"a-XX", b"", b"XX-b-Y", b"Y", b""]
+
+    assert substitute(chunks, {"XXXX": "1", "YY": "22"}) == b"a-1-b-22"
+
+
+def test_no_replacements_pass_through():
+    assert substitute([b"ab", b"cd"], {}) == b"abcd"
+
+
+def test_prepared_declaration_round_trip():
+    declaration = {"schemaVersion": "3.50.0", "app": {"class": "Application"}}
+    prepared = PreparedDeclaration.from_dict(declaration)
+
+    assert prepared.load() == declaration
+    assert prepared.size == len(json.dumps(declaration).encode())
+    assert json.loads(prepared.body().read()) == declaration
+
+
+def test_uncompressed_body_is_sent_with_content_length():
+    prepared = PreparedDeclaration.from_dict({"app": {"class": "Application"}})
+    request = requests.Request("POST", "https://device", data=prepared.body()).prepare()
+
+    assert request.headers["Content-Length"] == str(prepared.size)
+    assert "Transfer-Encoding" not in request.headers
+
+
+class StreamingClient:
+    """Minimal client with the SDK's streaming GET, answering 401 with an expired token first."""
+
+    address = "http://infrahub"
+
+    def __init__(self, expired: bool):
+        self.expired = expired
+        self.logins: list[bool] = []
+
+    @asynccontextmanager
+    async def _get_streaming(self, url: str):
+        request = httpx.Request("GET", url)
+        if self.expired:
+            self.expired = False
+            yield httpx.Response(401, json={"errors": [{"message": "Expired Signature"}]}, request=request)
+        else:
+            yield httpx.Response(200, content=b"declaration", request=request)
+
+    async def login(self, refresh: bool = False) -> None:
+        self.logins.append(refresh)
+
+
+async def read_object(client) -> bytes:
+    async with _stream_object(client, "storage-id") as response:
+        return await response.aread()
+
+
+def test_stream_object_refreshes_an_expired_login():
+    client = StreamingClient(expired=True)
+
+    assert asyncio.run(read_object(client)) == b"declaration"
+    assert client.logins == [True]
+
+
+def test_stream_object_needs_the_sdk_streaming_get():
+    class OldClient:
+        address = "http://infrahub"
+
+    with pytest.raises(RuntimeError, match="infrahub-sdk >= 1.19"):
+        asyncio.run(read_object(OldClient()))
@@ -0,0 +1,156 @@
+"""Tests for the per-backend circuit breaker and bounded executor."""
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+from infrahub_sdk.exceptions import (
+    GraphQLError,
+    NodeNotFoundError,
+    ServerNotReachableError,
+    ServerNotResponsiveError,
+    ValidationError,
+)
+
+from tasks.backends import (
+    Backend,
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+    RequestRejected,
+    is_infrahub_failure,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list[float]:
+    """Controllable time.monotonic for the breaker's cool-down."""
+    now = [1000.0]
+    monkeypatch.setattr("tasks.backends.time.monotonic", lambda: now[0])
+    return now
+
+
+def test_breaker_opens_after_threshold(clock: list[float]):
+    breaker = CircuitBreaker("test-open", failure_threshold=3, reset_timeout=10.0)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitState.closed
+    breaker.record_failure()
+    assert breaker.state == CircuitState.open
+    assert not breaker.allow()
+
+
+def test_success_resets_failure_count(clock: list[float]):
+    breaker = CircuitBreaker("test-reset", failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitState.closed
+
+
+def test_half_open_allows_one_probe(clock: list[float]):
+    breaker = CircuitBreaker("test-probe", failure_threshold=1, reset_timeout=10.0)
+    breaker.record_failure()
+    clock[0] += 9.9
+    assert not breaker.allow()
+    clock[0] += 0.1
+    assert breaker.allow()
+    assert breaker.state == CircuitState.half_open
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitState.closed
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens(clock: list[float]):
+    breaker = CircuitBreaker("test-reopen", failure_threshold=5, reset_timeout=10.0)
+    for _ in range(5):
+        breaker.record_failure()
+    clock[0] += 10.0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitState.open
+    assert not breaker.allow()
+
+
+def test_cancelled_probe_frees_the_slot(clock: list[float]):
+    breaker = CircuitBreaker("test-cancel", failure_threshold=1, reset_timeout=10.0)
+    breaker.record_failure()
+    clock[0] += 10.0
+    assert breaker.allow()
+    breaker.record_cancelled()
+    assert breaker.state == CircuitState.half_open
+    assert breaker.allow()
+
+
+def test_backend_rejections_do_not_open_breaker():
+    backend = Backend("test-rejected", max_workers=1, timeout=5.0, failure_threshold=1)
+
+    def rejected():
+        raise RequestRejected("invalid declaration")
+
+    with pytest.raises(RequestRejected):
+        asyncio.run(backend.run(rejected))
+    assert backend.breaker.state == CircuitState.closed
+
+
+def test_backend_timeout_opens_breaker_and_keeps_call_in_flight():
+    backend = Backend("test-timeout", max_workers=1, timeout=0.05, failure_threshold=1, reset_timeout=60.0)
+    release = threading.Event()
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(backend.run(release.wait))
+    assert backend.breaker.state == CircuitState.open
+    assert backend.in_flight == 1
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(backend.run(lambda: None))
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while backend.in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert backend.in_flight == 0
+
+
+def test_infrahub_application_errors_do_not_open_breaker():
+    backend = Backend(
+        "test-infrahub-app", max_workers=1, timeout=5.0, failure_threshold=2, is_failure=is_infrahub_failure
+    )
+
+    async def fail(exc: Exception) -> None:
+        async with backend.guard():
+            raise exc
+
+    # A deleted target, a rejected query, a schema mismatch in the flow's own code
+    application_errors = [
+        NodeNotFoundError(identifier={"id": ["gone"]}),
+        GraphQLError(errors=[{"message": "bad"}]),
+        AttributeError("x"),
+    ]
+    for exc in application_errors * 3:
+        with pytest.raises(type(exc)):
+            asyncio.run(fail(exc))
+    assert backend.breaker.state == CircuitState.closed
+
+    for _ in range(2):
+        with pytest.raises(ServerNotReachableError):
+            asyncio.run(fail(ServerNotReachableError(address="http://infrahub")))
+    assert backend.breaker.state == CircuitState.open
+
+
+@pytest.mark.parametrize(
+    ("exc", "failure"),
+    [
+        (ServerNotResponsiveError(url="http://infrahub/graphql", timeout=10), True),
+        (httpx.ConnectError("refused"), True),
+        (TimeoutError(), True),
+        (httpx.HTTPStatusError("", request=httpx.Request("GET", "http://i"), response=httpx.Response(503)), True),
+        (httpx.HTTPStatusError("", request=httpx.Request("GET", "http://i"), response=httpx.Response(404)), False),
+        (ValidationError(identifier="name", message="required"), False),
+    ],
+)
+def test_is_infrahub_failure(exc: Exception, failure: bool):
+    assert is_infrahub_failure(exc) is failure
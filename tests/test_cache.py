@@ -0,0 +1,58 @@
+"""Tests for the result cache keys of deploy and ticket tasks."""
+from types import SimpleNamespace
+
+import pytest
+
+from tasks.artifacts import PreparedDeclaration
+from tasks.cache import DeployKey, TicketKey
+from tasks.declaration_store import DeclarationStore
+
+
+def task_ctx(task_key: str = "task-a") -> SimpleNamespace:
+    return SimpleNamespace(task=SimpleNamespace(task_key=task_key))
+
+
+def test_ticket_key_uses_ritm_and_cat_item(ticket_created_payload: dict, ticket_created_application_payload: dict):
+    policy = TicketKey()
+    key = policy.compute_key(task_ctx(), {}, {"payload": ticket_created_payload})
+
+    assert key is not None
+    # A redelivery of the same ticket, with another event id, hits
+    redelivered = {**ticket_created_payload, "id": "another-event-id"}
+    assert policy.compute_key(task_ctx(), {"other": 1}, {"payload": redelivered}) == key
+    assert policy.compute_key(task_ctx(), {}, {"payload": ticket_created_application_payload}) != key
+
+
+def test_ticket_key_without_ritm_is_not_cached(generic_webhook_payload: dict):
+    policy = TicketKey()
+
+    assert policy.compute_key(task_ctx(), {}, {"payload": generic_webhook_payload}) is None
+    assert policy.compute_key(task_ctx(), {}, {}) is None
+
+
+def test_deploy_key_follows_device_generation(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("AS3_DECLARATION_STORE", str(tmp_path))
+    store = DeclarationStore()
+    policy = DeployKey()
+
+    def key(checksum: str) -> str | None:
+        return policy.compute_key(task_ctx(), {"target_id": "t1", "checksum": checksum, "cluster_ip": "10.0.0.1"}, {})
+
+    def deployed(checksum: str) -> None:
+        store.save("t1", "10.0.0.1", "cluster-a", "Bank", checksum, PreparedDeclaration.from_dict({"checksum": checksum}))
+
+    deployed("a")
+    key_a = key("a")
+    assert key("a") == key_a
+    deployed("b")
+    key_b = key("b")
+    # Going back to an earlier checksum must post again, and so must redeploying b after that
+    deployed("a")
+    assert key("a") != key_a
+    deployed("b")
+    assert key("b") != key_b
+
+    current = key("b")
+    store.invalidate("t1", "10.0.0.1")
+    assert key("b") != current
+    assert policy.compute_key(task_ctx(), {"target_id": "t1", "checksum": "b"}, {}) is None
@@ -0,0 +1,133 @@
+"""Tests for the AS3 deploy flow's helpers."""
+import asyncio
+
+import pytest
+
+from benchmarks.fakes import FakeInfrahub
+from flows import deploy_as3_application as deploy
+from flows.deploy_as3_application import (
+    AS3DeclarationRejected,
+    DeployTarget,
+    _post_app,
+    combine_statuses,
+    resolve_deploy_targets,
+)
+from tasks.common import DeploymentStatus
+
+
+class Device:
+    """Stands in for requests.post against one AS3 device, answering gzip and plain posts with fixed statuses."""
+
+    def __init__(self, gzip_status: int, plain_status: int):
+        self.statuses = {True: gzip_status, False: plain_status}
+        self.posts: list[bool] = []
+
+    def post(self, url, headers, data, verify, timeout):
+        gzip = headers.get("Content-Encoding") == "gzip"
+        self.posts.append(gzip)
+        return FakeResponse(self.statuses[gzip])
+
+
+class FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.text = ""
+
+    def json(self) -> dict:
+        return {}
+
+
+@pytest.fixture
+def auto_gzip(monkeypatch):
+    monkeypatch.setenv("AS3_GZIP", "auto")
+    monkeypatch.setattr(deploy, "_gzip_supported", {})
+    monkeypatch.setattr(deploy, "_gzip_probes", {})
+
+
+def post(monkeypatch, device: Device, times: int = 1) -> None:
+    monkeypatch.setattr(deploy.requests, "post", device.post)
+    for _ in range(times):
+        try:
+            _post_app("device", {}, "Bank", {"app": {"class": "Application"}})
+        except AS3DeclarationRejected:
+            pass
+
+
+@pytest.mark.parametrize("status", [400, 415, 422])
+def test_auto_gzip_falls_back_on_any_4xx(monkeypatch, auto_gzip, status: int):
+    device = Device(gzip_status=status, plain_status=200)
+    post(monkeypatch, device, times=2)
+
+    assert device.posts == [True, False, False]
+
+
+def test_auto_gzip_415_is_decisive_even_if_the_declaration_is_rejected(monkeypatch, auto_gzip):
+    device = Device(gzip_status=415, plain_status=422)
+    post(monkeypatch, device, times=2)
+
+    assert device.posts == [True, False, False]
+
+
+def test_auto_gzip_stops_probing_after_undecided_rejections(monkeypatch, auto_gzip):
+    device = Device(gzip_status=422, plain_status=422)
+    post(monkeypatch, device, times=deploy.GZIP_PROBES + 2)
+
+    assert device.posts == [True, False] * deploy.GZIP_PROBES + [False, False]
+
+
+def test_auto_gzip_is_remembered_when_accepted(monkeypatch, auto_gzip):
+    device = Device(gzip_status=200, plain_status=200)
+    post(monkeypatch, device, times=2)
+
+    assert device.posts == [True, True]
+
+
+@pytest.fixture
+def infrahub():
+    client = FakeInfrahub()
+    yield client
+    client.close()
+
+
+def test_single_cluster_deploys_to_its_primary_address(infrahub: FakeInfrahub):
+    application, _ = infrahub.add_application("10.0.0.1")
+
+    assert asyncio.run(resolve_deploy_targets(application)) == [DeployTarget("cluster-10.0.0.1", "10.0.0.1")]
+
+
+def test_every_cluster_of_a_multi_cluster_application(infrahub: FakeInfrahub):
+    application, _ = infrahub.add_application(["10.0.0.1", "10.0.1.1"])
+
+    assert asyncio.run(resolve_deploy_targets(application)) == [
+        DeployTarget("cluster-10.0.0.1", "10.0.0.1"),
+        DeployTarget("cluster-10.0.1.1", "10.0.1.1"),
+    ]
+
+
+def test_cluster_members_only_when_asked(monkeypatch, infrahub: FakeInfrahub):
+    cluster = infrahub.add_cluster("10.0.0.1", member_addresses=["10.0.0.2", "10.0.0.3"])
+    application = infrahub.add_node("NetautoFlexApplication", f5_cluster=cluster)
+
+    assert asyncio.run(resolve_deploy_targets(application)) == [DeployTarget("cluster-10.0.0.1", "10.0.0.1")]
+
+    monkeypatch.setenv("AS3_DEPLOY_ALL_MEMBERS", "true")
+    application = infrahub.add_node("NetautoFlexApplication", f5_cluster=cluster)
+    assert asyncio.run(resolve_deploy_targets(application)) == [
+        DeployTarget("cluster-10.0.0.1", "10.0.0.2"),
+        DeployTarget("cluster-10.0.0.1", "10.0.0.3"),
+    ]
+
+
+@pytest.mark.parametrize(
+    ("statuses", "combined"),
+    [
+        ([], DeploymentStatus.unknown),
+        ([DeploymentStatus.deployed], DeploymentStatus.deployed),
+        ([DeploymentStatus.deployed, DeploymentStatus.deployed], DeploymentStatus.deployed),
+        ([DeploymentStatus.deployed, DeploymentStatus.failed], DeploymentStatus.failed),
+        ([DeploymentStatus.failed, DeploymentStatus.failed], DeploymentStatus.failed),
+    ],
+)
+def test_combine_statuses(statuses: list[DeploymentStatus], combined: DeploymentStatus):
+    assert combine_statuses(statuses) == combined
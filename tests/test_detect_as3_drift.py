@@ -0,0 +1,74 @@
+"""Tests for drift detection against the last known good declaration store."""
+import copy
+
+import pytest
+
+from benchmarks.fakes import as3_declaration
+from flows.detect_as3_drift import find_drift
+from tasks.artifacts import PreparedDeclaration
+from tasks.declaration_store import DeclarationStore
+
+TENANT = "Bank"
+
+
+@pytest.fixture
+def store(tmp_path) -> DeclarationStore:
+    return DeclarationStore(str(tmp_path))
+
+
+def deployed_tenant(*declarations: dict) -> dict:
+    """The GET /declare answer for a device running declarations in TENANT."""
+    tenant = {"class": "Tenant"}
+    for declaration in declarations:
+        tenant.update({k: v for k, v in declaration.items() if k != "schemaVersion"})
+    return {"class": "ADC", "schemaVersion": "3.50.0", TENANT: tenant}
+
+
+def save(store: DeclarationStore, target_id: str, declaration: dict) -> dict:
+    store.save(target_id, "10.0.0.1", "cluster-a", TENANT, "checksum-" + target_id, PreparedDeclaration.from_dict(declaration))
+    return store.get(target_id, "10.0.0.1")
+
+
+def test_no_drift_when_device_matches(store: DeclarationStore):
+    app_a, app_b = as3_declaration("app_a"), as3_declaration("app_b")
+    records = [save(store, "t1", app_a), save(store, "t2", app_b)]
+
+    assert find_drift(store, records, deployed_tenant(app_a, app_b)) == []
+
+
+def test_changed_application_is_reported(store: DeclarationStore):
+    app_a = as3_declaration("app_a")
+    record = save(store, "t1", app_a)
+    on_device = copy.deepcopy(app_a)
+    on_device["app_a"]["pool_0"]["members"][0]["servicePort"] = 8080
+
+    assert find_drift(store, [record], deployed_tenant(on_device)) == [
+        {
+            "target_id": "t1",
+            "address": "10.0.0.1",
+            "cluster": "cluster-a",
+            "tenant": TENANT,
+            "application": "app_a",
+            "checksum": "checksum-t1",
+            "reason": "changed",
+        }
+    ]
+
+
+def test_missing_application_and_tenant_are_reported(store: DeclarationStore):
+    app_a, app_b = as3_declaration("app_a"), as3_declaration("app_b")
+    records = [save(store, "t1", app_a), save(store, "t2", app_b)]
+
+    drifted = find_drift(store, records, deployed_tenant(app_a))
+    assert [(d["application"], d["reason"]) for d in drifted] == [("app_b", "missing")]
+
+    drifted = find_drift(store, records, {"class": "ADC", "schemaVersion": "3.50.0"})
+    assert [(d["application"], d["reason"]) for d in drifted] == [("app_a", "missing"), ("app_b", "missing")]
+
+
+def test_key_order_on_device_is_not_drift(store: DeclarationStore):
+    app_a = as3_declaration("app_a", pools=3)
+    record = save(store, "t1", app_a)
+    reordered = {"app_a": dict(reversed(list(app_a["app_a"].items())))}
+
+    assert find_drift(store, [record], deployed_tenant(reordered)) == []
@@ -0,0 +1,94 @@
+"""Tests for the ingest service's bounded queues and backpressure."""
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from flows.priority import PriorityClass
+from services import ingest
+from services.ingest import create_app
+
+
+class SlowJournal:
+    """Journal stand-in whose appends take a while, as on a slow disk."""
+
+    def __init__(self, delay: float = 0.1):
+        self.delay = delay
+        self.appended = []
+        self._lock = threading.Lock()
+
+    def append(self, payload) -> None:
+        time.sleep(self.delay)
+        with self._lock:
+            self.appended.append(payload.id)
+
+
+async def post(app, payloads: list[dict], concurrently: bool = False) -> list[httpx.Response]:
+    # httpx's ASGI transport does not run the lifespan, so the queues are started here
+    for queue in app.state.queues.values():
+        await queue.start()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ingest") as client:
+            if concurrently:
+                return await asyncio.gather(*(client.post("/webhook", json=p) for p in payloads))
+            return [await client.post("/webhook", json=p) for p in payloads]
+    finally:
+        for queue in app.state.queues.values():
+            await queue.stop(drain_timeout=0)
+
+
+def blocked_app(maxsize: int = 1, retry_after: int = 7):
+    """Ingest app whose handlers never finish, so each class holds workers + maxsize events."""
+    never = asyncio.Event()
+
+    async def handler(payload):
+        await never.wait()
+
+    return create_app(handler=handler, maxsize=maxsize, workers={p: 1 for p in PriorityClass}, retry_after=retry_after)
+
+
+@pytest.fixture(autouse=True)
+def no_journal(monkeypatch):
+    monkeypatch.setattr(ingest, "get_journal", lambda: None)
+
+
+def test_invalid_payload_is_rejected_with_422():
+    (response,) = asyncio.run(post(blocked_app(), [{"id": "no-data"}]))
+
+    assert response.status_code == 422
+    assert response.json()["status"] == "error"
+
+
+def test_full_queue_answers_429_with_retry_after(generic_webhook_payload: dict):
+    payloads = [{**generic_webhook_payload, "id": f"event-{i}"} for i in range(4)]
+    responses = asyncio.run(post(blocked_app(maxsize=1, retry_after=7), payloads))
+
+    assert responses[0].status_code == 202
+    assert responses[0].json()["priority"] == PriorityClass.bulk.value
+    assert responses[-1].status_code == 429
+    assert responses[-1].headers["Retry-After"] == "7"
+    assert responses[-1].json() == {"status": "busy", "id": "event-3", "priority": "bulk"}
+
+
+def test_a_full_class_does_not_block_the_others(generic_webhook_payload: dict, ticket_created_payload: dict):
+    bulk = [{**generic_webhook_payload, "id": f"bulk-{i}"} for i in range(4)]
+    urgent = {**ticket_created_payload, "id": "urgent"}
+    responses = asyncio.run(post(blocked_app(maxsize=1), bulk + [urgent]))
+
+    assert responses[len(bulk) - 1].status_code == 429
+    assert responses[-1].status_code == 202
+    assert responses[-1].json()["priority"] == PriorityClass.urgent.value
+
+
+def test_events_answered_429_are_never_journaled(monkeypatch, generic_webhook_payload: dict):
+    journal = SlowJournal()
+    monkeypatch.setattr(ingest, "get_journal", lambda: journal)
+    payloads = [{**generic_webhook_payload, "id": f"event-{i}"} for i in range(6)]
+    responses = asyncio.run(post(blocked_app(maxsize=2), payloads, concurrently=True))
+
+    accepted = [p["id"] for p, r in zip(payloads, responses) if r.status_code == 202]
+    assert {r.status_code for r in responses} == {202, 429}
+    assert sorted(journal.appended) == sorted(accepted)
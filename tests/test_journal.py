@@ -0,0 +1,59 @@
+"""Tests for the on-disk webhook event journal."""
+import pytest
+
+from flows.models import WebhookPayload
+from tasks.journal import LOG_SUFFIX, EventJournal
+
+
+def event(payload: dict, node_id: str, event_type: str = "infrahub.node.updated") -> WebhookPayload:
+    data = {**payload["data"], "node_id": node_id}
+    return WebhookPayload.model_validate({**payload, "data": data, "event": event_type})
+
+
+@pytest.fixture
+def journal(tmp_path) -> EventJournal:
+    return EventJournal(str(tmp_path))
+
+
+def test_append_and_scan_in_order(journal: EventJournal, generic_webhook_payload: dict):
+    for i in range(3):
+        journal.append(event(generic_webhook_payload, f"node-{i}"), journaled_at=100.0 + i)
+
+    scanned = list(journal.scan())
+    assert [at for at, _ in scanned] == [100.0, 101.0, 102.0]
+    assert [payload["data"]["node_id"] for _, payload in scanned] == ["node-0", "node-1", "node-2"]
+    assert WebhookPayload.model_validate(scanned[0][1]).data.node_id == "node-0"
+
+
+def test_rotation_keeps_every_event(tmp_path, generic_webhook_payload: dict):
+    journal = EventJournal(str(tmp_path), max_segment_bytes=1)
+    for i in range(4):
+        journal.append(event(generic_webhook_payload, f"node-{i}"), journaled_at=float(i))
+
+    # Segments are named after the sequence number of their first event
+    assert journal.segments() == [f"{i:020d}" for i in range(4)]
+    assert len([n for n in tmp_path.iterdir() if n.name.endswith(LOG_SUFFIX)]) == 4
+    assert [payload["data"]["node_id"] for _, payload in journal.scan()] == [f"node-{i}" for i in range(4)]
+    assert [at for at, _ in journal.scan(since=1.5, until=3.0)] == [2.0, 3.0]
+
+
+def test_scan_filters(journal: EventJournal, generic_webhook_payload: dict):
+    journal.append(event(generic_webhook_payload, "a", "infrahub.node.created"), journaled_at=10.0)
+    journal.append(event(generic_webhook_payload, "b", "infrahub.node.updated"), journaled_at=20.0)
+    journal.append(event(generic_webhook_payload, "a", "infrahub.node.updated"), journaled_at=30.0)
+
+    def scanned(**filters) -> list[float]:
+        return [at for at, _ in journal.scan(**filters)]
+
+    # Time bounds are inclusive
+    assert scanned(since=20.0) == [20.0, 30.0]
+    assert scanned(until=20.0) == [10.0, 20.0]
+    assert scanned(since=11.0, until=29.0) == [20.0]
+    assert scanned(since=31.0) == []
+    assert scanned(events=["infrahub.node.updated"]) == [20.0, 30.0]
+    assert scanned(targets=["a"]) == [10.0, 30.0]
+    assert scanned(events=["infrahub.node.updated"], targets=["a"], since=15.0) == [30.0]
+
+
+def test_scan_of_empty_journal(journal: EventJournal):
+    assert list(journal.scan()) == []
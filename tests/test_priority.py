@@ -0,0 +1,72 @@
+"""Tests for webhook event priority classes."""
+import pytest
+
+from flows.models import WebhookPayload
+from flows.priority import PriorityClass, classify_event, priority_tag, work_queue_for
+
+
+def artifact_payload(checksum: str, checksum_previous: str, branch: str = "main") -> WebhookPayload:
+    return WebhookPayload.model_validate(
+        {
+            "id": "artifact-event",
+            "data": {
+                "node_id": "artifact-node",
+                "checksum": checksum,
+                "checksum_previous": checksum_previous,
+                "target_id": "target",
+                "storage_id": "storage",
+                "target_kind": "NetautoFlexApplication",
+            },
+            "event": "infrahub.artifact.updated",
+            "branch": branch,
+            "account_id": "account",
+            "occured_at": "2025-12-11T12:00:00Z",
+        }
+    )
+
+
+def on_branch(payload: dict, branch: str) -> WebhookPayload:
+    return WebhookPayload.model_validate({**payload, "branch": branch})
+
+
+def test_new_tickets_are_urgent_on_production_branches(ticket_created_payload: dict):
+    assert classify_event(on_branch(ticket_created_payload, "main")) == PriorityClass.urgent
+    assert classify_event(on_branch(ticket_created_payload, "feature-x")) == PriorityClass.standard
+
+
+def test_changed_artifacts_follow_the_branch():
+    assert classify_event(artifact_payload("new", "old")) == PriorityClass.urgent
+    assert classify_event(artifact_payload("new", "old", branch="feature-x")) == PriorityClass.standard
+
+
+def test_regenerated_artifacts_with_the_same_content_are_bulk():
+    assert classify_event(artifact_payload("same", "same")) == PriorityClass.bulk
+
+
+def test_other_events_are_bulk(generic_webhook_payload: dict):
+    assert classify_event(WebhookPayload.model_validate(generic_webhook_payload)) == PriorityClass.bulk
+
+
+def test_production_branches_are_configurable(monkeypatch, ticket_created_payload: dict):
+    monkeypatch.setenv("PRODUCTION_BRANCHES", "main, release")
+
+    assert classify_event(on_branch(ticket_created_payload, "release")) == PriorityClass.urgent
+    assert classify_event(artifact_payload("new", "old", branch="release")) == PriorityClass.urgent
+
+
+@pytest.mark.parametrize("priority", list(PriorityClass))
+def test_work_queue_defaults_to_the_class_name(monkeypatch, priority: PriorityClass):
+    monkeypatch.delenv(f"WORK_QUEUE_{priority.name.upper()}", raising=False)
+
+    assert work_queue_for(priority) == priority.value
+
+
+def test_work_queue_can_be_overridden(monkeypatch):
+    monkeypatch.setenv("WORK_QUEUE_BULK", "overnight")
+
+    assert work_queue_for(PriorityClass.bulk) == "overnight"
+    assert work_queue_for(PriorityClass.urgent) == "urgent"
+
+
+def test_priority_tag():
+    assert priority_tag(PriorityClass.standard) == "priority:standard"